@@ -0,0 +1,171 @@
+"""주문 내역 기반 개인화 추천 가산점 (상품 동시 구매 행렬 + 고객별 선호 벡터).
+
+오프라인/주기 작업(update)만 기록하고, 앱은 결과 파일을 읽기만 합니다.
+
+- affinity_state.json : 작업 상태. 동시 구매 행렬(cooc), 상품별 등장 주문 수(item_orders),
+                        고객별 처리한 주문 수(워터마크)와 구매 수량
+- affinity.json       : 앱이 읽는 고객별 가산점 벡터 (전화번호 뒷자리 -> 상위 상품 가산점)
+
+작업은 지난 실행 이후 바뀐 고객 파일(수정 시각 기준)만 읽고, 그중 고객별 워터마크 이후의
+새 주문만 반영합니다. 같은 잠금 아래에서 실행되므로 여러 번 겹쳐 실행되어도 안전합니다.
+주문 직후의 개인화는 다음 작업 실행 때 반영됩니다.
+
+    python affinity.py update [--data user_shards] [--state affinity_state.json] [--out affinity.json]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+import filestore
+import user_store
+from sales_stats import item_key
+
+AFFINITY_FILE = "affinity.json"
+STATE_FILE = "affinity_state.json"
+DIRECT_WEIGHT = 1.0     # 직접 구매한 상품의 가중치
+COOC_WEIGHT = 1.0       # 함께 구매된 상품(P(j|i))의 가중치
+VECTOR_SIZE = 20        # 고객별로 보관할 가산점 상위 상품 수
+MTIME_MARGIN_SECONDS = 2  # 고객 파일의 수정 시각은 교체보다 조금 앞서므로 지난 실행보다 이만큼 앞의 변경부터 읽음
+
+
+def read_json(path):
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            try:
+                data = json.load(f)
+                return data if isinstance(data, dict) else {}
+            except json.JSONDecodeError:
+                pass
+    return {}
+
+
+class AffinityIndex:
+    """update 작업용 인덱스. 앱 프로세스에서는 만들지 않습니다."""
+
+    def __init__(self, state_path=STATE_FILE, out_path=AFFINITY_FILE):
+        self.state_path = state_path
+        self.out_path = out_path
+        state = read_json(state_path)
+        self.cooc = state.get("cooc", {})
+        self.item_orders = state.get("item_orders", {})
+        self.users = state.get("users", {})
+        self.scanned_at = state.get("scanned_at")  # 지난 실행이 고객 파일을 읽기 시작한 시각
+        self.vectors = read_json(out_path)
+
+    def save(self, vectors=True):
+        state = {"cooc": self.cooc, "item_orders": self.item_orders, "users": self.users, "scanned_at": self.scanned_at}
+        filestore.write_json(self.state_path, state)
+        if vectors:
+            filestore.write_json(self.out_path, self.vectors)
+
+    def _apply(self, phone, order):
+        keys = []
+        user = self.users.setdefault(phone, {"seen": 0, "bought": {}})
+        for it in order.get("items", []) or []:
+            if not isinstance(it, dict):
+                continue
+            key = item_key(it)
+            user["bought"][key] = user["bought"].get(key, 0) + int(it.get("qty", 1) or 1)
+            if key not in keys:
+                keys.append(key)
+        for i in keys:
+            self.item_orders[i] = self.item_orders.get(i, 0) + 1
+            row = self.cooc.setdefault(i, {})
+            for j in keys:
+                if i != j:
+                    row[j] = row.get(j, 0) + 1
+        user["seen"] += 1
+
+    def _refresh_vector(self, phone):
+        """고객 가산점 벡터 재계산: 직접 구매 비중 + 구매 상품과 함께 팔린 상품의 P(j|i)."""
+        bought = self.users[phone]["bought"]
+        total = sum(bought.values()) or 1
+        scores = {}
+        for i, qty in bought.items():
+            share = qty / total
+            scores[i] = scores.get(i, 0.0) + DIRECT_WEIGHT * share
+            n_i = self.item_orders.get(i, 0) or 1
+            for j, c in self.cooc.get(i, {}).items():
+                scores[j] = scores.get(j, 0.0) + COOC_WEIGHT * share * c / n_i
+        top = sorted(scores.items(), key=lambda kv: -kv[1])[:VECTOR_SIZE]
+        peak = top[0][1] if top else 0
+        if peak > 0:
+            self.vectors[phone] = {k: round(v / peak, 3) for k, v in top}
+        else:
+            self.vectors.pop(phone, None)
+
+    def update_from_users(self, records):
+        """(전화번호 뒷자리, 레코드) 목록에서 워터마크 이후의 새 주문만 반영. orders 는 최신 주문이 앞에 쌓입니다."""
+        touched = 0
+        for phone, user in records:
+            orders = user.get("orders", []) if isinstance(user, dict) else []
+            seen = self.users.get(phone, {}).get("seen", 0)
+            new_orders = orders[: max(0, len(orders) - seen)]
+            if not new_orders:
+                continue
+            for order in reversed(new_orders):
+                if isinstance(order, dict):
+                    self._apply(phone, order)
+                else:
+                    self.users.setdefault(phone, {"seen": 0, "bought": {}})["seen"] += 1
+            self._refresh_vector(phone)
+            touched += 1
+        return touched
+
+
+def update(data_path, state_path=STATE_FILE, out_path=AFFINITY_FILE):
+    """잠금 아래에서 지난 실행 이후 바뀐 고객 레코드만 읽어 새 주문을 반영합니다. 갱신한 고객 수를 반환."""
+    with filestore.file_lock(f"{state_path}.lock"):
+        index = AffinityIndex(state_path, out_path)
+        started = time.time()
+        since = index.scanned_at - MTIME_MARGIN_SECONDS if index.scanned_at else None
+        touched = index.update_from_users(user_store.iter_users(data_path, modified_since=since))
+        index.scanned_at = started
+        index.save(vectors=touched > 0)
+    return touched
+
+
+class AffinityVectors:
+    """앱용 읽기 전용 가산점 벡터. 작업이 파일을 교체하면 다음 조회 때 다시 읽습니다."""
+
+    def __init__(self, path=AFFINITY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sig = None
+        self._vectors = {}
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def personal_bonus(self, phone):
+        """미리 계산된 고객 가산점 벡터 (0 ~ 1, 상품 키 -> 값)."""
+        sig = self._signature()
+        with self._lock:
+            if sig != self._sig:
+                self._vectors = read_json(self.path) if sig is not None else {}
+                self._sig = sig
+            return self._vectors.get(phone, {})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="개인화 추천 인덱스 도구")
+    sub = parser.add_subparsers(dest="command", required=True)
+    update_cmd = sub.add_parser("update", help="마지막 처리 이후의 새 주문을 반영")
+    update_cmd.add_argument("--data", default=user_store.DEFAULT_DIR, help="샤드 디렉터리 또는 예전 단일 JSON 파일")
+    update_cmd.add_argument("--state", default=STATE_FILE)
+    update_cmd.add_argument("--out", default=AFFINITY_FILE)
+    args = parser.parse_args(argv)
+
+    if args.command == "update":
+        touched = update(args.data, args.state, args.out)
+        print(f"{touched}명의 고객 선호 벡터를 갱신했습니다: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,15 @@
 import streamlit as st
 import pandas as pd
-import itertools, os, re, smtplib, ssl, uuid
-from email.mime.text import MIMEText
-from email.utils import formatdate
+import copy, itertools, os, re, uuid
 from datetime import datetime
-from PIL import Image
-import json
+
+import affinity
+import order_board
+import perf_metrics
+import popularity
+import sales_stats
+import user_store
+from perf_metrics import timed
 
 # ---------------- 기본 설정 ----------------
 st.set_page_config(page_title="AI 베이커리 추천·주문", layout="wide")
@@ -13,6 +17,7 @@ st.set_page_config(page_title="AI 베이커리 추천·주문", layout="wide")
 # Secret variables for configuration (replace with actual values in st.secrets)
 SHOP_NAME = st.secrets.get("SHOP_NAME", "Lucy Bakery")
 OWNER_EMAIL_PRIMARY = st.secrets.get("OWNER_EMAIL_PRIMARY", "owner@example.com")  # 사장님 이메일 (주문 알림용)
+OWNER_PASS = st.secrets.get("OWNER_PASS", "")  # 사장님 전용 페이지 비밀번호 (비어 있으면 비활성화)
 
 # ****************** 쿠폰 및 리워드 설정 ******************
 MIN_DISCOUNT_PURCHASE = 20000  # 10% 할인 쿠폰 적용을 위한 최소 구매 금액 (20,000원)
@@ -28,11 +33,20 @@ SMTP_HOST = st.secrets.get("SMTP_HOST", "smtp.gmail.com")
 SMTP_PORT = int(st.secrets.get("SMTP_PORT", "465"))
 SMTP_USER = st.secrets.get("SMTP_USER", "noreply@example.com")  # 발신 이메일
 SMTP_PASS = st.secrets.get("SMTP_PASS", "your_smtp_password")   # 발신 이메일 비밀번호
+SMTP_TIMEOUT_SECONDS = 10  # 메일 서버 연결/응답 대기 제한 (주문 처리 스레드가 무한정 멈추지 않도록)
 POPULAR_BONUS_SCORE = 1  # 인기 메뉴에 부여할 가산점
 TAG_BONUS_SCORE = 5      # 선택 태그 일치 메뉴에 부여할 가산점
+ORDER_POPULARITY_BONUS = 3  # 최근 판매량 1위 메뉴에 부여할 최대 가산점 (시간 감쇠 적용)
+PERSONAL_BONUS_SCORE = 2    # 고객 구매 이력 기반 개인화 최대 가산점
 
 # JSON 파일 경로 설정
-DATA_FILE = "user_data.json"
+DATA_FILE = "user_data.json"   # 예전 단일 고객 파일 (샤드 저장소 최초 실행 시 옮겨짐)
+USER_SHARD_DIR = "user_shards"
+USER_SHARD_COUNT = int(st.secrets.get("USER_SHARD_COUNT", user_store.DEFAULT_SHARDS))  # 모든 앱 프로세스가 같은 값을 써야 함
+COMMIT_WINDOW_SECONDS = 0.005  # 주문/가입 변경을 모아서 한 번에 기록하는 시간 창
+ORDER_KEY_LOOKBACK = 20        # 중복 주문 확인 시 살펴볼 최근 주문 수
+ORDER_ID_SUFFIX_LEN = 6        # 주문번호 뒤에 붙이는 order_key 글자 수
+BOARD_REFRESH_SECONDS = 1      # 사장님 주문 현황판 갱신 주기
 
 # ****************** 이미지 경로 설정 ******************
 LOGIN_IMAGES = [
@@ -40,10 +54,12 @@ LOGIN_IMAGES = [
     "event1.jpg",
     "poster1.jpg"
 ]
+IMAGE_MAX_WIDTH = 1200  # 화면 표시용 축소본 최대 너비 (원본 event1.jpg 는 5660px)
 # *****************************************************
 
 
 # ---------------- JSON 유틸리티 함수 (데이터 영속성) ----------------
+@timed()
 def normalize_user_db(db: dict) -> dict:
     """예전 스키마의 누락 필드를 기본값으로 보정."""
     if not isinstance(db, dict):
@@ -85,26 +101,50 @@ def normalize_user_db(db: dict) -> dict:
     return db
 
 
-def load_user_data():
-    """JSON 파일에서 사용자 데이터를 불러오고 누락 필드 보정."""
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            try:
-                raw = json.load(f)
-                return normalize_user_db(raw)
-            except json.JSONDecodeError:
-                return {}
-    else:
-        return {}
+@st.cache_resource
+def get_user_store():
+    """전화번호 뒷자리 기준 샤드 저장소. 샤드별 그룹 커밋과 파일 잠금으로 여러 프로세스가 공유합니다."""
+    return user_store.ShardedUserStore(
+        USER_SHARD_DIR,
+        USER_SHARD_COUNT,
+        legacy_file=DATA_FILE,
+        normalize=normalize_user_db,
+        window=COMMIT_WINDOW_SECONDS,
+    )
+
+
+@st.cache_resource
+def get_login_index():
+    """로그인 확인용 전화번호 → 비밀번호 인덱스 (프로세스당 1개, 가입 시 갱신)."""
+    return user_store.LoginIndex(get_user_store())
 
 
-def save_user_data(data):
-    """현재 사용자 데이터를 JSON 파일에 저장."""
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+def fetch_user(phone_suffix):
+    """커밋된 최신 고객 레코드 사본 (없으면 None)."""
+    return get_user_store().get(phone_suffix)
+
+
+def commit_signup(phone_suffix, password):
+    """신규 가입을 커밋. 다른 세션이 먼저 가입시킨 경우 기존 레코드를 돌려줍니다."""
+    def mutation(db):
+        if phone_suffix in db:
+            return False, copy.deepcopy(db[phone_suffix])
+        db[phone_suffix] = {
+            "pass": password,
+            "coupon_count": WELCOME_DISCOUNT_COUNT,
+            "coupon_amount": 0,
+            "stamps": 0,
+            "orders": [],
+        }
+        return True, copy.deepcopy(db[phone_suffix])
+
+    result, _ = get_user_store().submit(phone_suffix, mutation)
+    get_login_index().add(phone_suffix, result[1]["pass"])
+    return result
 
 
 # ---------------- 디자인 테마 적용 (이미지 배경 CSS 추가) ----------------
+@timed()
 def set_custom_style(is_login=False):
     BG_COLOR = "#FAF8F1"
     CARD_COLOR = "#F8F6F4"
@@ -260,15 +300,24 @@ def set_custom_style(is_login=False):
 # ---------------- 유틸 ----------------
 def money(x): return f"{int(x):,}원"
 def now_ts(): return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def new_order_id(order_key):
+    """화면/메일/현황판용 주문번호. 같은 초에 들어온 주문도 order_key 접미사로 구분됩니다."""
+    return f"O{datetime.now().strftime('%m%d%H%M%S')}-{order_key[:ORDER_ID_SUFFIX_LEN].upper()}"
 def normalize_str(s): return re.sub(r"\s+", " ", str(s).strip()) if pd.notna(s) else ""
 
 
 # ---------------- 이메일 ----------------
+@timed()
 def send_order_email(to_emails, shop_name, order_id, items, total, note):
     """주문 완료 시 사장님에게 알림 이메일을 전송합니다."""
     if not SMTP_USER or not SMTP_PASS or OWNER_EMAIL_PRIMARY == "owner@example.com":
         return False, "SMTP 계정 정보가 설정되지 않아 이메일을 보낼 수 없습니다. (개발 환경)"
 
+    # 메일 관련 모듈은 주문 시에만 필요하므로 세션 시작 비용에서 제외합니다.
+    import smtplib, ssl
+    from email.mime.text import MIMEText
+    from email.utils import formatdate
+
     msg_lines = [
         f"[{shop_name}] 신규 주문이 접수되었습니다.",
         f"주문번호: {order_id}",
@@ -289,7 +338,7 @@ def send_order_email(to_emails, shop_name, order_id, items, total, note):
     msg["Date"] = formatdate(localtime=True)
     try:
         ctx = ssl.create_default_context()
-        with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, context=ctx) as s:
+        with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, context=ctx, timeout=SMTP_TIMEOUT_SECONDS) as s:
             s.login(SMTP_USER, SMTP_PASS)
             s.sendmail(msg["From"], to_emails, msg.as_string())
         return True, ""
@@ -298,6 +347,7 @@ def send_order_email(to_emails, shop_name, order_id, items, total, note):
 
 
 # ---------------- 메뉴 로드 ----------------
+@timed("load_menu_data")
 @st.cache_data
 def load_menu_data():
     """CSV 파일을 읽고 데이터프레임을 전처리하고 스코어를 부여합니다."""
@@ -373,15 +423,125 @@ def load_menu_data():
 
     drink_categories = sorted(drink_df["category"].dropna().unique())
     bakery_tags = sorted({t for arr in bakery_df["tags_list"] for t in arr if t})
+    # 메뉴 구성이 바뀌면 달라지는 버전 값 (인기도 가산점 캐시 키)
+    menu_version = hash(tuple(bakery_df["name"]) + tuple(drink_df["name"]))
+
+    return bakery_df, drink_df, drink_categories, bakery_tags, menu_version
+
+
+bakery_df, drink_df, drink_categories, bakery_tags, menu_version = load_menu_data()
+
+
+@st.cache_resource
+def get_sales_stats():
+    """모든 세션이 공유하는 매출 집계 (주문 완료 시 증분 갱신)."""
+    return sales_stats.SalesStats()
+
+
+@st.cache_resource
+def get_popularity():
+    """모든 세션이 공유하는 주문 기반 인기도 카운터."""
+    return popularity.PopularityTracker()
+
+
+@st.cache_resource
+def menu_item_names(version):
+    """메뉴 버전별 item_id -> 상품명 인덱스 (베이커리/음료)."""
+    return {
+        "bakery": dict(zip(bakery_df["item_id"], bakery_df["name"])),
+        "drink": dict(zip(drink_df["item_id"], drink_df["name"])),
+    }
 
-    return bakery_df, drink_df, drink_categories, bakery_tags
 
+def popularity_bonus():
+    """item_id -> 최근 판매량 기반 가산점 (베이커리/음료 각각 1위 기준으로 환산)."""
+    tracker = get_popularity()
+    names = menu_item_names(menu_version)
+    bakery_bonus = tracker.bonus_scores((menu_version, "bakery"), names["bakery"], ORDER_POPULARITY_BONUS)
+    drink_bonus = tracker.bonus_scores((menu_version, "drink"), names["drink"], ORDER_POPULARITY_BONUS)
+    return {**bakery_bonus, **drink_bonus}
+
+
+@st.cache_resource
+def get_order_board():
+    """주문 커밋 시 사장님 주문 현황판으로 전달되는 채널 (모든 앱 프로세스가 같은 이벤트 로그를 공유)."""
+    return order_board.OrderBoard()
+
+
+@st.cache_resource
+def get_affinity():
+    """모든 세션이 공유하는 고객 선호 벡터 (affinity.py update 작업의 결과를 읽기만 함)."""
+    return affinity.AffinityVectors()
+
+
+def personal_bonus(phone):
+    """item_id -> 고객 구매 이력 기반 가산점. 미리 계산된 벡터를 메뉴 수만큼 조회합니다."""
+    vec = get_affinity().personal_bonus(phone)
+    if not vec:
+        return {}
+    bonus = {}
+    for names in menu_item_names(menu_version).values():
+        for item_id, name in names.items():
+            weight = vec.get(sales_stats.name_key(name))
+            if weight:
+                bonus[item_id] = round(PERSONAL_BONUS_SCORE * weight, 2)
+    return bonus
+
+
+# ---------------- 이미지 축소본 ----------------
+@st.cache_resource(show_spinner=False)
+def build_image_derivative(path, mtime, max_width=IMAGE_MAX_WIDTH):
+    """표시용 축소 이미지 바이트. 원본이 바뀌면 mtime 이 달라져 다시 만듭니다."""
+    from io import BytesIO
+    from PIL import Image
+
+    with Image.open(path) as im:
+        im.thumbnail((max_width, max_width * 4))
+        buf = BytesIO()
+        if im.mode in ("RGBA", "LA", "P"):
+            im.save(buf, format="PNG", optimize=True)
+        else:
+            im.convert("RGB").save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+def display_image(path):
+    """st.image 에 넘길 축소본 (실패 시 원본 경로)."""
+    try:
+        return build_image_derivative(path, os.path.getmtime(path))
+    except (OSError, ImportError):
+        return path
+
+
+# ---------------- 서버 워밍업 ----------------
+@st.cache_resource(show_spinner=False)
+def warm_up():
+    """프로세스당 한 번: 공유 저장소, 파생 인덱스, 이미지 축소본을 미리 준비합니다.
+
+    boot.py 로 서버를 띄우면 첫 손님이 접속하기 전에 실행됩니다.
+    """
+    get_user_store()
+    get_login_index()
+    get_sales_stats()
+    get_popularity()
+    get_affinity()
+    get_order_board()
+    menu_item_names(menu_version)
+    # 대용량 원본 축소는 첫 화면(로그인)을 막지 않도록 백그라운드에서 진행
+    import threading
+    threading.Thread(
+        target=lambda: [display_image(path) for path in dict.fromkeys(LOGIN_IMAGES)],
+        name="lucy-image-warmup",
+        daemon=True,
+    ).start()
+    return True
 
-bakery_df, drink_df, drink_categories, bakery_tags = load_menu_data()
 
 # ---------------- 세션 및 로그인 데이터 ----------------
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
+if "is_owner" not in st.session_state:
+    st.session_state.is_owner = False
 if "user" not in st.session_state:
     st.session_state.user = {}
 if "cart" not in st.session_state:
@@ -390,11 +550,8 @@ if "reco_results" not in st.session_state:
     st.session_state.reco_results = []
 if "is_reco_fallback" not in st.session_state:
     st.session_state.is_reco_fallback = False
-if "users_db" not in st.session_state:
-    st.session_state.users_db = load_user_data()
-else:
-    # 런타임에도 안전하게 보정
-    st.session_state.users_db = normalize_user_db(st.session_state.users_db)
+if "order_key" not in st.session_state:
+    st.session_state.order_key = uuid.uuid4().hex  # 주문 버튼 중복 클릭 방지용 멱등성 키
 
 # ---------------- 로그인 페이지 ----------------
 def show_login_page():
@@ -413,48 +570,54 @@ def show_login_page():
                 if not (re.fullmatch(r"\d{4}", phone_suffix) and re.fullmatch(r"\d{6}", password)):
                     st.error("휴대폰 번호 뒷 4자리와 비밀번호 6자리를 정확히 입력해주세요.")
                     return
-                if phone_suffix in st.session_state.users_db:
-                    user_data = st.session_state.users_db[phone_suffix]
-                    if user_data["pass"] == password:
-                        user_data.setdefault("stamps", 0)
-                        user_data.pop("coupon", None)
-                        user_data.setdefault("coupon_count", 0)
-                        user_data.setdefault("coupon_amount", 0)
-                        user_data.setdefault("orders", [])
-                        st.session_state.logged_in = True
-                        st.session_state.user = {
-                            "name": f"고객({phone_suffix})",
-                            "phone": phone_suffix,
-                            "coupon_count": user_data["coupon_count"],
-                            "coupon_amount": user_data["coupon_amount"],
-                            "stamps": user_data["stamps"],
-                            "orders": user_data["orders"],
-                        }
-                        st.success(f"{st.session_state.user['name']}님, 로그인되었습니다.")
-                        st.rerun()
-                    else:
-                        st.error("비밀번호가 일치하지 않습니다.")
+                # 공유 로그인 인덱스로 확인한 뒤, 해당 고객 레코드 하나만 불러옵니다.
+                registered, matched = get_login_index().verify(phone_suffix, password)
+                is_new = False
+                if registered and not matched:
+                    st.error("비밀번호가 일치하지 않습니다.")
+                    return
+                if registered:
+                    user_data = fetch_user(phone_suffix)
                 else:
-                    st.session_state.users_db[phone_suffix] = {
-                        "pass": password,
-                        "coupon_count": WELCOME_DISCOUNT_COUNT,
-                        "coupon_amount": 0,
-                        "stamps": 0,
-                        "orders": [],
-                    }
-                    st.session_state.logged_in = True
-                    st.session_state.user = {
-                        "name": f"고객({phone_suffix})",
-                        "phone": phone_suffix,
-                        "coupon_count": WELCOME_DISCOUNT_COUNT,
-                        "coupon_amount": 0,
-                        "stamps": 0,
-                        "orders": [],
-                    }
+                    is_new, user_data = commit_signup(phone_suffix, password)
+                    if user_data["pass"] != password:
+                        # 다른 프로세스에서 같은 번호로 먼저 가입한 경우
+                        st.error("비밀번호가 일치하지 않습니다.")
+                        return
+
+                user_data.setdefault("stamps", 0)
+                user_data.pop("coupon", None)
+                user_data.setdefault("coupon_count", 0)
+                user_data.setdefault("coupon_amount", 0)
+                user_data.setdefault("orders", [])
+                st.session_state.logged_in = True
+                st.session_state.user = {
+                    "name": f"고객({phone_suffix})",
+                    "phone": phone_suffix,
+                    "coupon_count": user_data["coupon_count"],
+                    "coupon_amount": user_data["coupon_amount"],
+                    "stamps": user_data["stamps"],
+                    "orders": user_data["orders"],
+                }
+                if is_new:
                     st.success("회원가입이 완료되었으며, **10% 할인 쿠폰 1개**가 지급되었습니다!")
                     st.balloons()
-                    save_user_data(st.session_state.users_db)
-                    st.rerun()
+                else:
+                    st.success(f"{st.session_state.user['name']}님, 로그인되었습니다.")
+                st.rerun()
+
+        with st.expander("🔑 사장님 로그인", expanded=False):
+            if not OWNER_PASS:
+                st.caption("사장님 페이지 비밀번호(OWNER_PASS)가 설정되지 않았습니다.")
+            else:
+                with st.form("owner_login_form"):
+                    owner_pass = st.text_input("사장님 비밀번호", type="password")
+                    if st.form_submit_button("사장님 페이지 열기", use_container_width=True):
+                        if owner_pass == OWNER_PASS:
+                            st.session_state.is_owner = True
+                            st.rerun()
+                        else:
+                            st.error("비밀번호가 일치하지 않습니다.")
 
 
 # ---------------- 장바구니 추가 헬퍼 ----------------
@@ -471,17 +634,22 @@ def add_item_to_cart(item, qty=1):
 
 
 # ---------------- 조합 및 스코어링 헬퍼 ----------------
-def find_combinations(drinks_df, bakery_df, n_people, n_bakery, max_budget):
+@timed()
+def find_combinations(drinks_df, bakery_df, n_people, n_bakery, max_budget, item_bonus=None):
     found_results = []
+    if item_bonus:
+        drinks_df = drinks_df.assign(score=drinks_df["score"] + drinks_df["item_id"].map(item_bonus).fillna(0))
+        bakery_df = bakery_df.assign(score=bakery_df["score"] + bakery_df["item_id"].map(item_bonus).fillna(0))
     drinks_to_use = drinks_df.to_dict("records")
     bakery_to_use = bakery_df.sort_values(by="score", ascending=False).head(15).to_dict("records")
-    combos = itertools.combinations(bakery_to_use, n_bakery) if n_bakery > 0 else [[]]
+    # 음료마다 같은 조합을 다시 순회하므로 리스트로 만들어 둡니다.
+    combos = list(itertools.combinations(bakery_to_use, n_bakery)) if n_bakery > 0 else [[]]
     for d in drinks_to_use:
         d_score = d.get("score", 1)
         for b_combo in combos:
             total_price = d["price"] * n_people + sum(b["price"] for b in b_combo)
             if total_price <= max_budget:
-                total_score = d_score + sum(b["score"] for b in b_combo)
+                total_score = round(d_score + sum(b["score"] for b in b_combo), 2)
                 found_results.append({
                     "drink": d,
                     "bakery": b_combo,
@@ -492,44 +660,107 @@ def find_combinations(drinks_df, bakery_df, n_people, n_bakery, max_budget):
 
 
 # ---------------- 주문 완료 처리 ----------------
-def process_order_completion(phone_suffix, order_id, df_cart, total, final_total, discount_type, discount_amount):
+def process_order_completion(phone_suffix, order_id, df_cart, total, final_total, discount_type, discount_amount, order_key, note=""):
     order_history_item = {
         "id": order_id,
         "date": now_ts(),
-        "items": df_cart[["name", "qty", "unit_price"]].to_dict("records"),
+        "items": df_cart[["item_id", "name", "qty", "unit_price"]].to_dict("records"),
         "total": int(total),
         "final_total": int(final_total),
         "discount_type": discount_type,
         "discount_amount": int(discount_amount),
         "stamps_earned": 1,
+        "order_key": order_key,
     }
-    st.session_state.users_db[phone_suffix]["orders"].insert(0, order_history_item)
-    st.session_state.user["orders"] = st.session_state.users_db[phone_suffix]["orders"]
+
+    def mutation(db):
+        """커밋 스레드에서 최신 고객 레코드에 주문/쿠폰/스탬프를 반영합니다."""
+        user = db[phone_suffix]
+        if any(o.get("order_key") == order_key for o in user["orders"][:ORDER_KEY_LOOKBACK]):
+            return {"duplicate": True, "reward": False, "user": copy.deepcopy(user)}
+        # 할인액은 세션의 (다른 기기에서 이미 쓴) 쿠폰 잔액으로 계산되었을 수 있으므로 최신 레코드로 확인
+        if discount_type == "Amount" and user["coupon_amount"] < discount_amount:
+            return {"rejected": "금액 쿠폰 잔액이 부족합니다", "user": copy.deepcopy(user)}
+        if discount_type == "Rate" and user["coupon_count"] <= 0:
+            return {"rejected": "남은 10% 할인 쿠폰이 없습니다", "user": copy.deepcopy(user)}
+
+        user["orders"].insert(0, order_history_item)
+        if discount_type == "Amount":
+            user["coupon_amount"] -= discount_amount
+        elif discount_type == "Rate":
+            user["coupon_count"] -= 1
+        user["stamps"] += 1
+
+        reward = user["stamps"] >= STAMP_GOAL
+        if reward:
+            user["coupon_amount"] += STAMP_REWARD_AMOUNT
+            user["stamps"] -= STAMP_GOAL
+        return {"duplicate": False, "reward": reward, "user": copy.deepcopy(user)}
+
+    # 같은 order_key 의 중복 클릭은 한 번만 적용되며, 기록(fsync)이 끝난 뒤에 반환됩니다.
+    # 이전 시도가 시간 초과로 끝났다면 그 사이 커밋되었을 수 있으므로, 후속 처리(알림 등)는
+    # 이번 시도에서 이어서 진행합니다.
+    resumed = st.session_state.get("order_pending") == order_key
+    st.session_state.order_pending = order_key
+    board, stats, popularity_tracker = get_order_board(), get_sales_stats(), get_popularity()
+    try:
+        result, applied = get_user_store().submit(phone_suffix, mutation, key=order_key)
+    except TimeoutError:
+        st.error("주문 저장이 지연되고 있습니다. 잠시 후 같은 버튼을 다시 눌러주세요. (중복 접수되지 않습니다)")
+        return
+    except Exception as e:
+        st.error(f"주문을 저장하지 못해 접수되지 않았습니다: {e}. 잠시 후 다시 시도해주세요.")
+        return
+
+    committed = result["user"]
+    if result.get("rejected"):
+        # 같은 order_key 로 다시 누르면 거절 결과가 그대로 돌아오므로 새 키를 발급합니다.
+        for field in ("coupon_count", "coupon_amount", "stamps", "orders"):
+            st.session_state.user[field] = committed[field]
+        st.session_state.order_key = uuid.uuid4().hex
+        st.session_state.order_pending = None
+        st.error(f"{result['rejected']}. 다른 기기에서 쿠폰이 먼저 사용되었을 수 있습니다. 쿠폰 선택을 확인한 뒤 다시 주문해주세요.")
+        return
+
+    # 재시도로 이어서 처리하는 경우 처음 커밋된 주문(주문번호 포함)을 기준으로 알립니다.
+    order_history_item = next(
+        (o for o in committed["orders"][:ORDER_KEY_LOOKBACK] if o.get("order_key") == order_key),
+        order_history_item,
+    )
+    order_id = order_history_item["id"]
+    fresh = (applied and not result["duplicate"]) or resumed
+    if fresh:
+        # 현황판/집계는 커밋 직후, 메일 전송과 st.* 호출보다 먼저 반영합니다. 메일이 늦어지거나
+        # 그 사이 다른 클릭으로 리런이 걸려 이후 단계가 중단되어도 접수된 주문은 빠지지 않습니다.
+        board.publish(dict(order_history_item, phone=phone_suffix, note=note))
+        stats.record_order(order_history_item)
+        popularity_tracker.record_order(order_history_item)
+
+    for field in ("coupon_count", "coupon_amount", "stamps", "orders"):
+        st.session_state.user[field] = committed[field]
+    st.session_state.cart = []
+    st.session_state.order_key = uuid.uuid4().hex
+    st.session_state.order_pending = None
+
+    if not fresh:
+        st.toast("이미 접수된 주문입니다.", icon="ℹ️")
+        st.rerun()
+
+    # 알림 메일은 주문이 기록된 뒤에만 보냅니다. 실패해도 주문은 현황판에 올라가 있습니다.
+    ok, err = send_order_email([OWNER_EMAIL_PRIMARY], SHOP_NAME, order_id, order_history_item["items"], final_total, note)
+    if ok:
+        st.toast(f"주문번호 #{order_id} 접수 완료. 최종 금액: {money(final_total)} (카운터 결제)", icon="✅")
+    else:
+        st.toast(f"주문은 접수되었지만 매장 알림 메일 전송에 실패했습니다: {err}. 카운터에 말씀해주세요.", icon="⚠️")
 
     if discount_type == "Amount":
-        st.session_state.user["coupon_amount"] -= discount_amount
-        st.session_state.users_db[phone_suffix]["coupon_amount"] -= discount_amount
         st.toast(f"금액 쿠폰 {money(discount_amount)}이(가) 사용되었습니다.", icon="💳")
     elif discount_type == "Rate":
-        st.session_state.user["coupon_count"] -= 1
-        st.session_state.users_db[phone_suffix]["coupon_count"] -= 1
         st.toast("10% 할인 쿠폰 1개가 사용되었습니다.", icon="💳")
-
-    st.session_state.user["stamps"] += 1
-    st.session_state.users_db[phone_suffix]["stamps"] += 1
     st.toast("주문이 완료되어 스탬프 1개가 적립되었습니다! ❤️", icon="🎉")
-
-    current_stamps = st.session_state.user["stamps"]
-    if current_stamps >= STAMP_GOAL:
-        st.session_state.user["coupon_amount"] += STAMP_REWARD_AMOUNT
-        st.session_state.users_db[phone_suffix]["coupon_amount"] += STAMP_REWARD_AMOUNT
-        st.session_state.user["stamps"] = current_stamps - STAMP_GOAL
-        st.session_state.users_db[phone_suffix]["stamps"] = current_stamps - STAMP_GOAL
+    if result["reward"]:
         st.balloons()
         st.success(f"🎉 **스탬프 {STAMP_GOAL}개 달성!** 아메리카노 1잔에 해당하는 **{money(STAMP_REWARD_AMOUNT)}** 금액 쿠폰이 추가 지급되었습니다.")
-
-    save_user_data(st.session_state.users_db)
-    st.session_state.cart = []
     st.rerun()
 
 
@@ -552,7 +783,6 @@ def show_main_app():
             st.session_state.cart = []
             st.session_state.reco_results = []
             st.session_state.is_reco_fallback = False
-            st.session_state.users_db = load_user_data()
             st.success("로그아웃되었습니다.")
             st.rerun()
 
@@ -564,26 +794,26 @@ def show_main_app():
         ["🎁 이벤트", "🥪 오늘의 추천: 잠봉 뵈르", "☕ 오늘의 추천: 아메리카노 & 소금빵"]
     )
 
-    with tab_event:
+    with tab_event, perf_metrics.timer("render_tab_event"):
         with st.expander("이벤트 보기", expanded=False):
             st.image(
-                "event1.jpg",
+                display_image("event1.jpg"),
                 caption="앱 사용 인증샷으로 쿠키도 받고 디저트 세트도 받으세요!",
                 use_column_width=True,
             )
 
-    with tab_reco_jam:
+    with tab_reco_jam, perf_metrics.timer("render_tab_reco_jam"):
         with st.expander("잠봉 뵈르 포스터 보기", expanded=False):
             st.image(
-                "poster2.jpg",
+                display_image("poster2.jpg"),
                 caption="오늘의 든든한 점심 추천! 바삭한 바게트에 햄과 버터의 환상적인 조화!",
                 use_column_width=True,
             )
 
-    with tab_reco_salt:
+    with tab_reco_salt, perf_metrics.timer("render_tab_reco_salt"):
         with st.expander("소금빵 세트 포스터 보기", expanded=False):
             st.image(
-                "poster1.jpg",
+                display_image("poster1.jpg"),
                 caption="국민 조합! 짭짤 고소한 소금빵과 시원한 아메리카노 세트!",
                 use_column_width=True,
             )
@@ -597,7 +827,7 @@ def show_main_app():
     )
 
     # ===== 추천 로직 =====
-    with tab_reco:
+    with tab_reco, perf_metrics.timer("render_tab_reco"):
         st.header("AI 맞춤형 메뉴 추천")
 
         st.subheader("1. 추천 조건 설정")
@@ -643,13 +873,16 @@ def show_main_app():
                         axis=1,
                     )
 
+                item_bonus = popularity_bonus()
+                for item_id, bonus in personal_bonus(st.session_state.user.get("phone")).items():
+                    item_bonus[item_id] = item_bonus.get(item_id, 0) + bonus
                 bakery_use_for_reco = bakery_strict if st.session_state.n_bakery > 0 and st.session_state.sel_tags else bakery_base
-                results = find_combinations(drinks, bakery_use_for_reco, n_people_val, st.session_state.n_bakery, max_budget)
+                results = find_combinations(drinks, bakery_use_for_reco, n_people_val, st.session_state.n_bakery, max_budget, item_bonus)
                 is_fallback = False
 
                 if not results and st.session_state.sel_tags:
                     is_fallback = True
-                    results = find_combinations(drinks, bakery_base, n_people_val, st.session_state.n_bakery, max_budget)
+                    results = find_combinations(drinks, bakery_base, n_people_val, st.session_state.n_bakery, max_budget, item_bonus)
 
                 if not results:
                     st.warning("조건에 맞는 메뉴 조합을 찾지 못했습니다. 인원수, 예산, 베이커리 개수 등의 조건을 완화하거나 변경해보세요.")
@@ -696,7 +929,7 @@ def show_main_app():
                 st.markdown("---")
 
     # ===== 메뉴판 (주문 가능) =====
-    with tab_menu:
+    with tab_menu, perf_metrics.timer("render_tab_menu"):
         st.header("📋 전체 메뉴판")
 
         st.subheader("🍞 베이커리 메뉴")
@@ -731,7 +964,7 @@ def show_main_app():
                     add_item_to_cart(item, qty=1)
 
     # ===== 장바구니 (쿠폰 로직 수정) =====
-    with tab_cart:
+    with tab_cart, perf_metrics.timer("render_tab_cart"):
         st.header("🛍️ 장바구니")
 
         if not st.session_state.cart:
@@ -832,32 +1065,20 @@ def show_main_app():
             note = st.text_area("요청사항", height=50)
 
             if st.button("주문 완료 및 매장 알림", type="primary", use_container_width=True):
-                phone_suffix = st.session_state.user["phone"]
-                oid = f"O{datetime.now().strftime('%m%d%H%M%S')}"
-                ok, err = send_order_email(
-                    [OWNER_EMAIL_PRIMARY],
-                    SHOP_NAME,
-                    oid,
-                    df_cart.to_dict("records"),
+                process_order_completion(
+                    st.session_state.user["phone"],
+                    new_order_id(st.session_state.order_key),
+                    df_cart,
+                    total,
                     final_total,
+                    discount_type,
+                    discount_amount,
+                    st.session_state.order_key,
                     note,
                 )
-                if ok:
-                    st.success(f"주문번호 **#{oid}** 접수 완료. 최종 금액: {money(final_total)} (카운터 결제)")
-                    process_order_completion(
-                        phone_suffix,
-                        oid,
-                        df_cart,
-                        total,
-                        final_total,
-                        discount_type,
-                        discount_amount,
-                    )
-                else:
-                    st.error(f"주문 알림 이메일 전송에 실패했습니다: {err}. 관리자에게 문의해주세요.")
 
     # ===== 스탬프 & 주문 내역 =====
-    with tab_history:
+    with tab_history, perf_metrics.timer("render_tab_history"):
         st.header("❤️ 스탬프 & 주문 내역")
 
         current_stamps = st.session_state.user.get("stamps", 0)
@@ -887,7 +1108,10 @@ def show_main_app():
         if not orders:
             st.info("아직 주문 내역이 없습니다. 지금 첫 주문을 완료하고 스탬프를 적립하세요!")
         else:
+            board = get_order_board()
             for order in orders:
+                status = board.status(order.get("order_key"))
+                status_label = f"[{status}] " if status else ""
                 # 안전 접근(.get)으로 KeyError 방지
                 disc_amt = int(order.get("discount_amount", 0) or 0)
                 disc_type = order.get("discount_type", None)
@@ -895,7 +1119,7 @@ def show_main_app():
                 discount_info = f"할인: - {money(disc_amt)} ({disc_label})"
 
                 with st.expander(
-                    f"**[{order.get('date','').split(' ')[0]}]** 주문번호 #{order.get('id','-')} | 최종 결제: **{money(int(order.get('final_total', 0) or 0))}**",
+                    f"{status_label}**[{order.get('date','').split(' ')[0]}]** 주문번호 #{order.get('id','-')} | 최종 결제: **{money(int(order.get('final_total', 0) or 0))}**",
                     expanded=False,
                 ):
                     st.markdown(f"**주문 시간:** {order.get('date','-')}")
@@ -911,9 +1135,159 @@ def show_main_app():
                         st.write(f"- {name} x {qty} ({money(unit_price)}/개)")
 
 
+# ---------------- 사장님 전용 페이지 ----------------
+@st.fragment(run_every=BOARD_REFRESH_SECONDS)
+def show_order_board_panel():
+    """주문 현황판. 고객 데이터 파일 대신 현황판 이벤트 로그에서 새로 덧붙은 줄만 읽습니다."""
+    board = get_order_board()
+    orders = board.snapshot()
+    active = [o for o in orders if o["status"] != order_board.STATUSES[-1]]
+    done = [o for o in orders if o["status"] == order_board.STATUSES[-1]]
+
+    cols = st.columns(len(order_board.STATUSES))
+    for col, status in zip(cols, order_board.STATUSES):
+        col.metric(status, f"{sum(1 for o in orders if o['status'] == status)}건")
+
+    if not active:
+        st.info("처리할 주문이 없습니다.")
+    next_label = {"접수": "준비 시작", "준비중": "준비 완료"}
+    for o in active:
+        with st.container(border=True):
+            c1, c2, c3 = st.columns([5, 3, 2])
+            with c1:
+                st.markdown(f"**#{o['id']}** 고객({o['phone']}) · {o['date'].split(' ')[-1]}")
+                st.write(", ".join(f"{it['name']} x{it['qty']}" for it in o["items"]))
+                if o.get("note"):
+                    st.caption(f"요청사항: {o['note']}")
+            with c2:
+                st.markdown(f"**{o['status']}** · {money(o['final_total'])}")
+            with c3:
+                st.button(
+                    next_label[o["status"]],
+                    key=f"board_{o['order_key']}",
+                    on_click=board.advance,
+                    args=(o["order_key"],),
+                    use_container_width=True,
+                )
+
+    if done:
+        with st.expander(f"완료된 주문 ({len(done)}건)", expanded=False):
+            for o in done[:20]:
+                st.write(f"#{o['id']} 고객({o['phone']}) · {money(o['final_total'])} · {o['date']}")
+
+
+def show_perf_debug_panel():
+    st.header("⏱️ 성능 디버그")
+    if not perf_metrics.ENABLED:
+        st.info("계측이 비활성화되어 있습니다. (LUCY_METRICS=0)")
+        return
+
+    rows = perf_metrics.REGISTRY.summary()
+    if not rows:
+        st.info("아직 수집된 계측 데이터가 없습니다.")
+    else:
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+    exposition = perf_metrics.REGISTRY.render_prometheus()
+    c1, c2 = st.columns(2)
+    with c1:
+        st.download_button("Prometheus 텍스트 다운로드", exposition, file_name="lucy_metrics.prom", use_container_width=True)
+    with c2:
+        if st.button("계측 초기화", use_container_width=True):
+            perf_metrics.REGISTRY.reset()
+            st.rerun()
+    if perf_metrics.METRICS_FILE:
+        st.caption(f"파일 내보내기: {perf_metrics.METRICS_FILE}")
+    if perf_metrics.METRICS_PORT:
+        st.caption(f"엔드포인트: http://127.0.0.1:{perf_metrics.METRICS_PORT}/metrics")
+    with st.expander("Prometheus 텍스트 보기", expanded=False):
+        st.code(exposition, language="text")
+
+
+def show_sales_panel():
+    st.header("📊 매출 분석")
+    today = datetime.now().strftime("%Y-%m-%d")
+    stats = get_sales_stats().snapshot(today)
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("오늘 매출", money(stats["today_revenue"]))
+    c2.metric("오늘 주문 수", f"{stats['today_orders']}건")
+    c3.metric("누적 매출", money(stats["revenue_total"]))
+    c4.metric("발급 스탬프", f"{stats['stamps_issued']}개")
+
+    st.subheader(f"일별 매출 (최근 {sales_stats.DASHBOARD_DAYS}일)")
+    if stats["order_count"]:
+        days = list(stats["revenue_by_day"])
+        st.bar_chart(pd.DataFrame({"매출": list(stats["revenue_by_day"].values())}, index=days))
+    else:
+        st.info("아직 집계된 주문이 없습니다.")
+
+    st.subheader("오늘 시간대별 매출")
+    hours = list(stats["revenue_by_hour"])
+    st.bar_chart(pd.DataFrame({"매출": list(stats["revenue_by_hour"].values())}, index=[h[-2:] for h in hours]))
+
+    c_items, c_coupons = st.columns(2)
+    with c_items:
+        st.subheader("상품별 판매 수량")
+        units = sorted(stats["units_by_item"].items(), key=lambda kv: -kv[1])
+        st.dataframe(
+            pd.DataFrame(
+                [{"상품": k, "수량": v} for k, v in units],
+                columns=["상품", "수량"],
+            ),
+            use_container_width=True,
+            hide_index=True,
+        )
+    with c_coupons:
+        st.subheader("쿠폰 사용 현황")
+        st.dataframe(
+            pd.DataFrame(
+                [{"할인 유형": k, "사용 횟수": v["count"], "할인액": v["amount"]} for k, v in stats["coupon_usage"].items()],
+                columns=["할인 유형", "사용 횟수", "할인액"],
+            ),
+            use_container_width=True,
+            hide_index=True,
+        )
+
+    st.markdown("---")
+    if st.button("주문 내역으로 집계 다시 만들기", use_container_width=True):
+        rebuilt = get_sales_stats().rebuild(get_user_store().iter_users())
+        st.toast(f"{rebuilt['order_count']}건의 주문으로 집계를 다시 만들었습니다.")
+        st.rerun()
+
+
+def show_owner_page():
+    set_custom_style(is_login=False)
+    c_title, c_logout = st.columns([8, 2])
+    with c_title:
+        st.title(f"🔑 {SHOP_NAME} 사장님 페이지")
+    with c_logout:
+        if st.button("나가기", use_container_width=True):
+            st.session_state.is_owner = False
+            st.rerun()
+
+    tab_board, tab_sales, tab_perf = st.tabs(["🧾 주문 현황", "📊 매출 분석", "⏱️ 성능 디버그"])
+    with tab_board:
+        st.header("🧾 주문 현황")
+        show_order_board_panel()
+    with tab_sales:
+        show_sales_panel()
+    with tab_perf:
+        show_perf_debug_panel()
+
+
 # ---------------- 메인 실행 ----------------
 if __name__ == "__main__":
-    if st.session_state.logged_in:
-        show_main_app()
-    else:
-        show_login_page()
+    perf_metrics.start_http_server()
+    with perf_metrics.timer("warm_up"):
+        warm_up()
+    try:
+        with perf_metrics.timer("rerun"):
+            if st.session_state.is_owner:
+                show_owner_page()
+            elif st.session_state.logged_in:
+                show_main_app()
+            else:
+                show_login_page()
+    finally:
+        perf_metrics.REGISTRY.maybe_export()
@@ -0,0 +1,111 @@
+"""콜드 스타트 벤치마크: app.py 첫 실행 중 임포트되는 모듈과 시간을 측정합니다.
+
+새 프로세스에서 `python -X importtime` 으로 app.py 를 헤드리스(AppTest)로 실행하고,
+스크립트 실행 중에 새로 임포트된 최상위 모듈별 누적 시간, 첫 실행/재실행 시간을 기록합니다.
+결과는 startup_baseline.json 과 비교하며, 주문 시에만 필요한 모듈이 시작 경로에 다시
+들어오거나 임포트 시간이 허용치 이상 늘면 실패합니다.
+
+    python benchmarks/bench_startup.py            # 기준선과 비교
+    python benchmarks/bench_startup.py --update   # 기준선 갱신
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+BASELINE_FILE = os.path.join(HERE, "startup_baseline.json")
+MARKER = "--- app start ---"
+TOLERANCE = 0.5  # 기준선 대비 허용 증가율 (임포트 시간은 측정 잡음이 큼)
+
+# 세션 시작 경로에서 임포트되면 안 되는 모듈 (주문/메일 전송 시에만 필요)
+DEFERRED_MODULES = ["smtplib", "email.mime"]
+
+CHILD = r"""
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=300)
+at.secrets["SHOP_NAME"] = "bench"
+print(%(marker)r, file=sys.stderr, flush=True)
+t = time.perf_counter(); at.run(); cold = time.perf_counter() - t
+print(%(marker)r, file=sys.stderr, flush=True)
+t = time.perf_counter(); at.run(); warm = time.perf_counter() - t
+errors = [str(e.value) for e in at.exception]
+print(json.dumps({"cold_run_s": cold, "rerun_s": warm, "errors": errors}))
+""" % {"marker": MARKER}
+
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure():
+    workdir = tempfile.mkdtemp(prefix="lucy_bench_")
+    for name in os.listdir(APP_DIR):
+        if name.lower().endswith((".csv", ".jpg", ".png")):
+            shutil.copy(os.path.join(APP_DIR, name), workdir)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD, os.path.join(APP_DIR, "app.py")],
+        cwd=workdir, capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=APP_DIR),
+    )
+    shutil.rmtree(workdir, ignore_errors=True)
+    if proc.returncode != 0:
+        raise SystemExit(proc.stderr[-2000:])
+
+    # 첫 실행 구간(마커 사이)의 임포트만 집계
+    section = proc.stderr.split(MARKER)[1]
+    modules, all_names = {}, []
+    for m in LINE.finditer(section):
+        name, indent = m.group(4), len(m.group(3))
+        all_names.append(name)
+        if indent == 1:  # 최상위 임포트만 (하위 모듈 시간은 누적값에 포함)
+            modules[name] = modules.get(name, 0) + int(m.group(2))
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {
+        "python": sys.version.split()[0],
+        "cold_run_s": round(result["cold_run_s"], 3),
+        "rerun_s": round(result["rerun_s"], 3),
+        "import_total_ms": round(sum(modules.values()) / 1000, 1),
+        "top_imports_ms": {k: round(v / 1000, 1) for k, v in sorted(modules.items(), key=lambda kv: -kv[1])[:25]},
+        "deferred_imported": sorted({d for d in DEFERRED_MODULES for n in all_names if n == d or n.startswith(d + ".")}),
+        "errors": result["errors"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="app.py 콜드 스타트 벤치마크")
+    parser.add_argument("--update", action="store_true", help="측정 결과로 기준선을 갱신")
+    args = parser.parse_args(argv)
+
+    current = measure()
+    print(json.dumps(current, ensure_ascii=False, indent=2))
+    if args.update or not os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"기준선을 저장했습니다: {BASELINE_FILE}")
+        return 0
+
+    with open(BASELINE_FILE, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    failures = []
+    if current["errors"]:
+        failures.append(f"앱 실행 오류: {current['errors']}")
+    if current["deferred_imported"]:
+        failures.append(f"지연 임포트 대상이 시작 경로에서 임포트됨: {current['deferred_imported']}")
+    limit = baseline["import_total_ms"] * (1 + TOLERANCE)
+    if current["import_total_ms"] > limit:
+        failures.append(f"임포트 시간 {current['import_total_ms']}ms > 허용치 {limit:.1f}ms")
+    new_heavy = [m for m in current["top_imports_ms"] if m not in baseline["top_imports_ms"] and current["top_imports_ms"][m] > 20]
+    if new_heavy:
+        failures.append(f"새로 추가된 무거운 임포트: {new_heavy}")
+    for line in failures:
+        print(f"FAIL {line}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""서버 부팅 시 캐시를 미리 채운 뒤 같은 프로세스에서 Streamlit 서버를 시작합니다.
+
+    python boot.py [streamlit run 옵션...]
+    예) python boot.py --server.port 8501 --server.headless true
+
+app.py 를 헤드리스로 한 번 실행해 무거운 모듈 임포트, 메뉴 캐시(st.cache_data),
+공유 저장소와 이미지 축소본(st.cache_resource)을 채워 둡니다. 이 캐시들은 프로세스 전역이므로
+이어서 시작되는 서버의 첫 세션부터 그대로 재사용됩니다.
+"""
+import os
+import sys
+import time
+
+APP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+
+def warm(app_file=APP_FILE):
+    from streamlit.testing.v1 import AppTest
+
+    start = time.perf_counter()
+    at = AppTest.from_file(app_file, default_timeout=300)
+    at.run()
+    for e in at.exception:
+        print(f"[boot] 워밍업 중 오류: {e.value}", file=sys.stderr)
+    print(f"[boot] 워밍업 완료: {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+
+def main():
+    warm()
+    from streamlit.web import cli
+
+    sys.argv = ["streamlit", "run", APP_FILE, *sys.argv[1:]]
+    sys.exit(cli.main())
+
+
+if __name__ == "__main__":
+    main()
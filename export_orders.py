@@ -0,0 +1,265 @@
+"""주문 내역을 회계용 평면 행으로 내보내기 (날짜별 파티션, CSV 또는 Parquet).
+
+고객 저장소 디렉터리는 고객 파일을 하나씩, 예전 단일 파일은 json.load 없이 고객 레코드 단위로 읽어 들이며,
+행은 chunk 단위로 파일에 기록하므로 메모리 사용량은 내역 크기와 무관합니다.
+마지막 내보내기 워터마크 이후의 주문만 내보내므로 야간 작업은 새 주문만 처리합니다.
+주문 시각은 커밋 전에 (프로세스마다 자기 시계로) 찍히므로, 실행 시작 기준 최근
+SETTLE_SECONDS 동안의 주문은 이번 실행에서 제외하고 다음 실행에서 내보냅니다.
+
+    python export_orders.py --out exports --format csv
+    python export_orders.py --out exports --format parquet --full
+
+출력 구조: <out>/orders/date=YYYY-MM-DD/part-*.csv, <out>/order_items/date=.../part-*.csv
+"""
+import argparse
+import csv
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import filestore
+import user_store
+
+DEFAULT_CHUNK_ROWS = 5000
+READ_CHUNK = 64 * 1024
+WATERMARK_FILE = "_watermark.json"
+SETTLE_SECONDS = 300  # 커밋 지연과 앱 프로세스 간 시계 차이를 흡수하는 유예 시간
+
+ORDER_COLUMNS = [
+    "order_id", "order_key", "phone", "date", "total", "final_total",
+    "discount_type", "discount_amount", "stamps_earned", "item_count",
+]
+ITEM_COLUMNS = [
+    "order_id", "order_key", "phone", "date", "line_no", "item_id", "name",
+    "qty", "unit_price", "line_total",
+]
+
+
+def iter_users(path, read_chunk=READ_CHUNK):
+    """{"전화번호 뒷자리": {...}, ...} 형태의 파일에서 (키, 레코드) 를 하나씩 읽습니다.
+
+    버퍼에는 현재 읽고 있는 고객 레코드 하나만 유지됩니다.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf, pos, eof = "", 0, False
+
+        def fill(minimum=read_chunk):
+            nonlocal buf, pos, eof
+            chunk = f.read(max(minimum, read_chunk))
+            if not chunk:
+                eof = True
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        def skip_ws():
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos].isspace():
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return
+                fill()
+
+        def expect(ch):
+            nonlocal pos
+            skip_ws()
+            if pos >= len(buf) or buf[pos] != ch:
+                raise ValueError(f"'{ch}' 가 필요합니다 (위치 {f.tell()})")
+            pos += 1
+
+        def decode():
+            nonlocal pos
+            skip_ws()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                    pos = end
+                    return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    # 레코드가 버퍼보다 크면 버퍼 크기만큼 더 읽어 재시도 횟수를 줄입니다.
+                    fill(len(buf) - pos)
+
+        fill()
+        expect("{")
+        skip_ws()
+        if pos < len(buf) and buf[pos] == "}":
+            return
+        while True:
+            key = decode()
+            expect(":")
+            yield key, decode()
+            skip_ws()
+            if pos < len(buf) and buf[pos] == ",":
+                pos += 1
+                continue
+            expect("}")
+            return
+
+
+def order_identity(phone, order):
+    return order.get("order_key") or f"{phone}:{order.get('id', '')}"
+
+
+def iter_rows(users, watermark=None, until=None):
+    """워터마크 이후, until(미포함) 이전 주문의 (주문 행, 상품 행 목록) 을 생성합니다."""
+    wm_date = (watermark or {}).get("date", "")
+    wm_keys = set((watermark or {}).get("keys", []))
+    for phone, user in users:
+        if not isinstance(user, dict):
+            continue
+        for order in user.get("orders", []) or []:
+            if not isinstance(order, dict):
+                continue
+            date = str(order.get("date", ""))
+            if until is not None and date >= until:
+                continue
+            # 주문은 최신순으로 쌓이므로 워터마크 이전 주문을 만나면 해당 고객은 끝
+            if date < wm_date:
+                break
+            key = order_identity(phone, order)
+            if date == wm_date and key in wm_keys:
+                continue
+            items = [it for it in order.get("items", []) or [] if isinstance(it, dict)]
+            order_row = {
+                "order_id": order.get("id", ""),
+                "order_key": key,
+                "phone": phone,
+                "date": date,
+                "total": int(order.get("total", 0) or 0),
+                "final_total": int(order.get("final_total", order.get("total", 0)) or 0),
+                "discount_type": order.get("discount_type") or "",
+                "discount_amount": int(order.get("discount_amount", 0) or 0),
+                "stamps_earned": int(order.get("stamps_earned", 0) or 0),
+                "item_count": len(items),
+            }
+            item_rows = []
+            for line_no, it in enumerate(items, start=1):
+                qty = int(it.get("qty", 1) or 1)
+                unit_price = int(it.get("unit_price", it.get("price", 0)) or 0)
+                item_rows.append({
+                    "order_id": order_row["order_id"],
+                    "order_key": key,
+                    "phone": phone,
+                    "date": date,
+                    "line_no": line_no,
+                    "item_id": it.get("item_id", ""),
+                    "name": it.get("name", it.get("item_name", "상품")),
+                    "qty": qty,
+                    "unit_price": unit_price,
+                    "line_total": qty * unit_price,
+                })
+            yield order_row, item_rows
+
+
+class PartitionedWriter:
+    """date=YYYY-MM-DD 파티션별로 행을 모았다가 chunk_rows 를 넘으면 파일로 내보냅니다."""
+
+    def __init__(self, root, columns, fmt, run_id):
+        self.root = root
+        self.columns = columns
+        self.fmt = fmt
+        self.run_id = run_id
+        self.buffers = {}
+        self.buffered = 0
+        self.parts = 0
+        self.rows = 0
+
+    def add(self, row):
+        self.buffers.setdefault(row["date"][:10] or "unknown", []).append(row)
+        self.buffered += 1
+
+    def flush(self):
+        for day, rows in self.buffers.items():
+            folder = os.path.join(self.root, f"date={day}")
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, f"part-{self.run_id}-{self.parts:05d}.{self.fmt}")
+            if self.fmt == "parquet":
+                write_parquet(path, rows, self.columns)
+            else:
+                with open(path, "w", encoding="utf-8", newline="") as f:
+                    writer = csv.DictWriter(f, fieldnames=self.columns)
+                    writer.writeheader()
+                    writer.writerows(rows)
+            self.parts += 1
+            self.rows += len(rows)
+        self.buffers = {}
+        self.buffered = 0
+
+
+def write_parquet(path, rows, columns):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise SystemExit("Parquet 내보내기에는 pyarrow 가 필요합니다. (pip install pyarrow)") from e
+    table = pa.Table.from_pydict({c: [r[c] for r in rows] for c in columns})
+    pq.write_table(table, path)
+
+
+def load_watermark(out):
+    path = os.path.join(out, WATERMARK_FILE)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return None
+
+
+def save_watermark(out, watermark):
+    filestore.write_json(os.path.join(out, WATERMARK_FILE), watermark)
+
+
+def export(data, out, fmt="csv", full=False, chunk_rows=DEFAULT_CHUNK_ROWS, settle_seconds=SETTLE_SECONDS):
+    os.makedirs(out, exist_ok=True)
+    # 샤드를 차례로 읽는 동안 커밋되는 주문이 워터마크 뒤로 밀려 누락되지 않도록
+    # 워터마크는 실행 시작보다 settle_seconds 앞에서 멈춥니다.
+    until = (datetime.now() - timedelta(seconds=settle_seconds)).strftime("%Y-%m-%d %H:%M:%S")
+    watermark = None if full else load_watermark(out)
+    run_id = uuid.uuid4().hex[:8]
+    orders = PartitionedWriter(os.path.join(out, "orders"), ORDER_COLUMNS, fmt, run_id)
+    items = PartitionedWriter(os.path.join(out, "order_items"), ITEM_COLUMNS, fmt, run_id)
+
+    new_wm = dict(watermark) if watermark else {"date": "", "keys": []}
+    if os.path.isdir(data):
+        users = user_store.iter_records(data)
+    else:
+        users = iter_users(data) if os.path.exists(data) else iter([])
+    for order_row, item_rows in iter_rows(users, watermark, until):
+        orders.add(order_row)
+        for row in item_rows:
+            items.add(row)
+        if order_row["date"] > new_wm["date"]:
+            new_wm = {"date": order_row["date"], "keys": [order_row["order_key"]]}
+        elif order_row["date"] == new_wm["date"]:
+            new_wm["keys"].append(order_row["order_key"])
+        if orders.buffered + items.buffered >= chunk_rows:
+            orders.flush()
+            items.flush()
+    orders.flush()
+    items.flush()
+
+    # 모든 파일을 쓴 다음에 워터마크를 옮겨야 중간 실패 시 다음 실행에서 다시 내보냅니다.
+    save_watermark(out, new_wm)
+    return orders.rows, items.rows, new_wm
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="주문 내역 스트리밍 내보내기")
+    parser.add_argument("--data", default=user_store.DEFAULT_DIR, help="샤드 디렉터리 또는 예전 단일 JSON 파일")
+    parser.add_argument("--out", default="exports")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--full", action="store_true", help="워터마크를 무시하고 전체 내역을 내보냅니다")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--settle-seconds", type=int, default=SETTLE_SECONDS,
+                        help="실행 시작 기준 이 시간 이내의 주문은 다음 실행으로 미룹니다")
+    args = parser.parse_args(argv)
+
+    n_orders, n_items, wm = export(args.data, args.out, args.format, args.full, args.chunk_rows, args.settle_seconds)
+    print(f"주문 {n_orders}건, 상품 {n_items}행을 내보냈습니다. (워터마크: {wm['date'] or '-'})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""JSON 데이터 파일 공용 유틸리티 (원자적 기록, 프로세스 간 잠금).
+
+- atomic_open / write_json : 임시 파일에 쓰고 교체하므로 읽는 쪽은 반쯤 쓰인 파일을 보지 않습니다.
+- append_durable           : 로그 파일 끝에 덧붙이고 fsync (실패하면 덧붙이던 내용을 잘라 냄)
+- file_lock                : <경로>.lock 등의 잠금 파일에 대한 배타적 flock (프로세스가 죽으면 자동 해제)
+- JsonFile                 : 잠금 → 최신 내용 다시 읽기 → 변경 → 기록 순서로 갱신하는 공유 JSON 파일
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: 프로세스 간 잠금 없이 단일 프로세스로만 사용
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path):
+    """path 에 대한 배타적 프로세스 간 잠금."""
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def fsync_dir(directory):
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def temp_path(path):
+    """path 옆에 만드는 기록용 임시 파일 이름 (프로세스/스레드마다 다름)."""
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+@contextmanager
+def atomic_open(path, durable=True):
+    """쓰기용 임시 파일을 열어 주고, 블록이 정상 종료되면 path 로 교체합니다.
+
+    durable=True 이면 교체 전후로 파일과 디렉터리를 fsync 합니다. 블록에서 예외가
+    나면 기존 파일은 그대로 남습니다.
+    """
+    tmp = temp_path(path)
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            yield f
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    if durable:
+        fsync_dir(os.path.dirname(os.path.abspath(path)))
+
+
+def write_json(path, data, indent=None, durable=True):
+    with atomic_open(path, durable) as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+
+
+def append_durable(path, data):
+    """data(bytes) 를 path 끝에 덧붙이고 fsync 합니다. 호출자가 잠금으로 덧붙이기를 직렬화해야 합니다.
+
+    기록 도중 실패하면 덧붙이던 부분을 잘라 내므로 다음 기록이 깨진 줄 뒤에 붙지 않습니다.
+    """
+    created = not os.path.exists(path)
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        start = os.fstat(fd).st_size
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            os.fsync(fd)
+        except BaseException:
+            os.ftruncate(fd, start)
+            raise
+    finally:
+        os.close(fd)
+    if created:
+        fsync_dir(os.path.dirname(os.path.abspath(path)))
+
+
+class JsonFile:
+    """여러 프로세스가 함께 갱신하는 JSON 파일.
+
+    read() 는 파일이 바뀌지 않았으면 마지막으로 읽은 객체를 그대로 돌려줍니다 (수정 금지).
+    transaction() 은 <경로>.lock 을 잡고 최신 내용을 새로 읽어 넘겨준 뒤, 블록이 정상
+    종료되면 기록합니다. 따라서 다른 프로세스의 갱신을 덮어쓰지 않습니다.
+    """
+
+    def __init__(self, path, normalize=None, indent=None):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.indent = indent
+        self._normalize = normalize
+        self._mutex = threading.Lock()
+        self._cache = None
+        self._cache_sig = None
+
+    def signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _parse(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+        return self._normalize(data) if self._normalize else data
+
+    def _write(self, data):
+        write_json(self.path, data, indent=self.indent)
+
+    def read(self):
+        sig = self.signature()
+        if self._cache is None or sig != self._cache_sig:
+            data = self._parse()
+            self._cache, self._cache_sig = data, sig
+        return self._cache
+
+    @contextmanager
+    def transaction(self):
+        with self._mutex, file_lock(self.lock_path):
+            data = self._parse()
+            yield data
+            self._write(data)
+            self._cache, self._cache_sig = data, self.signature()
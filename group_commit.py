@@ -0,0 +1,146 @@
+"""고객 데이터 쓰기 경로의 그룹 커밋 (write-behind committer).
+
+여러 세션이 요청한 변경(mutation)을 짧은 시간 창 동안 모아 하나의 트랜잭션 안에서
+순서대로 적용하고, 배치마다 한 번만 커밋합니다 (고객 저장소는 샤드 커밋 로그에 한 줄을
+덧붙이는 fsync 1회). submit 호출자는 자신이 포함된 배치가 디스크에 반영된 뒤에야 결과를
+돌려받습니다.
+
+같은 멱등성 키(idempotency key)로 다시 제출된 변경은 적용되지 않고 처음 결과를 돌려줍니다.
+
+post 는 기다리지 않는 변경입니다 (다시 만들 수 있는 집계용). 배치 기록이 실패하면 다음
+배치에서 다시 시도하며, 프로세스 종료 시 flush_all 로 남은 변경을 기록합니다.
+"""
+import atexit
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+COMMIT_WINDOW = 0.005      # 배치를 모으는 시간 (초)
+MAX_BATCH = 256            # 배치당 최대 변경 수
+KEY_CACHE_SIZE = 4096      # 처리 완료된 멱등성 키 보관 개수
+EXIT_FLUSH_TIMEOUT = 10.0  # 종료 시 남은 변경 기록을 기다리는 시간 (초)
+
+_committers = weakref.WeakSet()
+
+
+class _Pending:
+    __slots__ = ("fn", "key", "posted", "done", "result", "error")
+
+    def __init__(self, fn, key, posted=False):
+        self.fn = fn
+        self.key = key
+        self.posted = posted
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class GroupCommitter:
+    """transaction() 은 최신 데이터를 넘겨주고 블록이 정상 종료되면 기록하는 컨텍스트 매니저입니다."""
+
+    def __init__(self, transaction, window=COMMIT_WINDOW, max_batch=MAX_BATCH, name="lucy-group-commit"):
+        self._transaction = transaction
+        self.window = window
+        self.max_batch = max_batch
+        self.name = name
+        self._cond = threading.Condition()
+        self._queue = []
+        self._committing = False
+        self._inflight = {}
+        self._done_keys = OrderedDict()
+        self.batches = 0
+        self.mutations = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+        _committers.add(self)
+
+    def submit(self, fn, key=None, timeout=10.0):
+        """fn(data) 를 다음 배치에 적용하고, 기록이 끝나면 (결과, 새로 적용 여부) 를 반환."""
+        with self._cond:
+            if key is not None and key in self._done_keys:
+                return self._done_keys[key], False
+            pending = self._inflight.get(key) if key is not None else None
+            applied = pending is None
+            if pending is None:
+                pending = _Pending(fn, key)
+                self._queue.append(pending)
+                if key is not None:
+                    self._inflight[key] = pending
+                self._cond.notify_all()
+        if not pending.done.wait(timeout):
+            raise TimeoutError("그룹 커밋이 제한 시간 안에 끝나지 않았습니다.")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result, applied
+
+    def post(self, fn):
+        """fn(data) 를 다음 배치에 넣고 기다리지 않고 돌아옵니다."""
+        with self._cond:
+            self._queue.append(_Pending(fn, None, posted=True))
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """대기 중인 변경이 모두 기록될 때까지 기다립니다. 제한 시간 안에 끝나면 True."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and not self._committing, timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+            # 동시에 들어오는 다른 세션의 변경을 조금 더 기다렸다가 함께 기록
+            time.sleep(self.window)
+            with self._cond:
+                batch = self._queue[: self.max_batch]
+                del self._queue[: self.max_batch]
+                self._committing = True
+            self._commit(batch)
+
+    def _commit(self, batch):
+        failure = None
+        try:
+            with self._transaction() as data:
+                for p in batch:
+                    try:
+                        p.result = p.fn(data)
+                    except Exception as e:
+                        p.error = e
+        except Exception as e:
+            # 기록에 실패하면 배치 전체가 반영되지 않은 것으로 알립니다.
+            failure = e
+            for p in batch:
+                if p.error is None:
+                    p.error = e
+        self.batches += 1
+        self.mutations += len(batch)
+
+        with self._cond:
+            if failure is not None:
+                # 기다리는 호출자가 없는 변경은 다음 배치에서 다시 시도합니다.
+                retry = [p for p in batch if p.posted and p.error is failure]
+                for p in retry:
+                    p.error = None
+                self._queue[:0] = retry
+            for p in batch:
+                if p.key is None:
+                    continue
+                self._inflight.pop(p.key, None)
+                if p.error is None:
+                    self._done_keys[p.key] = p.result
+                    if len(self._done_keys) > KEY_CACHE_SIZE:
+                        self._done_keys.popitem(last=False)
+            self._committing = False
+            self._cond.notify_all()
+        for p in batch:
+            p.done.set()
+
+
+def flush_all(timeout=EXIT_FLUSH_TIMEOUT):
+    """프로세스의 모든 커밋 처리기에 남은 변경이 기록될 때까지 기다립니다 (종료 시, 검증 전)."""
+    for committer in list(_committers):
+        committer.flush(timeout)
+
+
+atexit.register(flush_all)
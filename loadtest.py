@@ -0,0 +1,375 @@
+"""동시 세션 부하 테스트 (streamlit.testing.v1.AppTest 기반).
+
+세션마다 로그인/회원가입 → AI 추천 → 장바구니 담기 → 쿠폰 적용 → 주문 완료를 반복하고,
+리런 지연 분위수, 처리량, 세션당 메모리, 데이터 정합성(스탬프/쿠폰/유실 주문)을 보고합니다.
+이메일은 스텁 SMTP 로 대체되며, 데이터 파일은 임시 작업 폴더에 생성됩니다.
+
+기본 실행은 같은 작업 폴더(같은 고객 샤드, 집계, 현황판)를 공유하는 프로세스
+DEFAULT_REPLICAS 개로 세션을 나눠 동시에 실행하고, 전체 처리량과 합쳐진 정합성 결과를
+보고합니다. 여러 프로세스의 주문이 실제로 겹치므로 샤드 잠금과 커밋 로그, 프로세스 간
+공유 파일(매출 집계, 현황판)의 갱신이 경합 상황에서 검증됩니다.
+
+    python loadtest.py --sessions 20 --orders 2 --replicas 4
+
+--replicas 1 은 한 프로세스에서 세션 스레드만 띄웁니다. AppTest 는 전역 상태(secrets,
+Runtime 인스턴스)를 실행마다 바꿔 끼우므로 세션들은 스크립트 실행 구간(커밋 대기 포함)을
+직렬화하며, 커밋 배치는 항상 1건입니다. 이 모드의 수치는 동시 처리량이 아니라 한
+프로세스의 순차 리런 용량이며, 보고서의 mode 에 그렇게 표시됩니다.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import smtplib
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_FILE = os.path.join(APP_DIR, "app.py")
+ASSET_EXTS = (".csv", ".jpg", ".png")
+PASSWORD = "123456"
+DEFAULT_REPLICAS = 4
+SEQUENTIAL_MODE = "single-process (sequential): AppTest 리런이 직렬화되어 커밋 배치 1건, 순차 처리 용량"
+
+RUN_LOCK = threading.Lock()  # 한 프로세스 안의 AppTest 실행 직렬화 (모듈 설명 참고)
+
+
+class StubSMTP:
+    """smtplib.SMTP_SSL 대체. 전송된 메시지를 메모리에 기록합니다."""
+
+    sent = []
+    _lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def login(self, user, password):
+        pass
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        with StubSMTP._lock:
+            StubSMTP.sent.append(msg)
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+class Session:
+    def __init__(self, phone, orders, think, rng):
+        from streamlit.testing.v1 import AppTest
+
+        self.phone = phone
+        self.orders_target = orders
+        self.think = think
+        self.rng = rng
+        self.at = AppTest.from_file(APP_FILE, default_timeout=120)
+        self.at.secrets["OWNER_EMAIL_PRIMARY"] = "loadtest@example.com"
+        self.at.secrets["SMTP_USER"] = "loadtest@example.com"
+        self.at.secrets["SMTP_PASS"] = "loadtest"
+        self.latencies = []   # (step, seconds)
+        self.acked_orders = 0
+        self.errors = []
+
+    def _step(self, name, action):
+        if self.think:
+            time.sleep(self.rng.uniform(0, self.think))
+        with RUN_LOCK:
+            start = time.perf_counter()
+            action()
+            self.latencies.append((name, time.perf_counter() - start))
+            if self.at.exception:
+                self.errors.append(f"{name}: {self.at.exception[0].value}")
+
+    def _button(self, label=None, key=None):
+        for b in self.at.button:
+            if (label is not None and b.label == label) or (key is not None and b.key == key):
+                return b
+        raise LookupError(label or key)
+
+    def login(self):
+        self._step("load", self.at.run)
+
+        def submit():
+            self.at.text_input[0].input(self.phone)
+            self.at.text_input[1].input(PASSWORD)
+            self._button(label="로그인 / 가입").click().run()
+        self._step("login", submit)
+
+    def recommend(self):
+        self._step("recommend", lambda: self._button(label="AI 추천 보기").click().run())
+
+    def add_to_cart(self):
+        reco = self.at.session_state.reco_results
+        if reco:
+            self._step("add_to_cart", lambda: self._button(key="d_reco_1").click().run())
+        menu_keys = [b.key for b in self.at.button if b.key and b.key.startswith("menu_b_")]
+        for key in self.rng.sample(menu_keys, min(2, len(menu_keys))):
+            self._step("add_to_cart", lambda key=key: self._button(key=key).click().run())
+
+    def apply_coupon(self):
+        user = self.at.session_state.user
+        total = sum(it["qty"] * it["unit_price"] for it in self.at.session_state.cart)
+        radio = next((r for r in self.at.radio if r.key == "coupon_choice"), None)
+        if radio is None:
+            return
+        wanted = None
+        if user.get("coupon_count", 0) > 0 and total >= 20000:
+            wanted = next((o for o in radio.options if "10% 할인 쿠폰" in o), None)
+        elif user.get("coupon_amount", 0) > 0:
+            wanted = next((o for o in radio.options if "금액 쿠폰" in o), None)
+        if wanted:
+            self._step("coupon", lambda: radio.set_value(wanted).run())
+
+    def place_order(self):
+        before = len(self.at.session_state.user.get("orders", []))
+        self._step("order", lambda: self._button(label="주문 완료 및 매장 알림").click().run())
+        if len(self.at.session_state.user.get("orders", [])) > before:
+            self.acked_orders += 1
+
+    def run(self):
+        try:
+            self.login()
+            for _ in range(self.orders_target):
+                self.recommend()
+                self.add_to_cart()
+                self.apply_coupon()
+                self.place_order()
+        except Exception as e:  # 시나리오 중단도 결과에 포함
+            self.errors.append(f"{type(e).__name__}: {e}")
+
+
+def prepare_workdir(path=None):
+    workdir = path or tempfile.mkdtemp(prefix="lucy_loadtest_")
+    for name in os.listdir(APP_DIR):
+        if name.lower().endswith(ASSET_EXTS):
+            shutil.copy(os.path.join(APP_DIR, name), workdir)
+    return workdir
+
+
+def stats_problems(acked_total):
+    """공유 매출 집계 파일의 주문 수가 확인된 주문 수와 같은지 확인합니다."""
+    if not os.path.exists("sales_stats.json"):
+        return []
+    with open("sales_stats.json", "r", encoding="utf-8") as f:
+        stats_orders = json.load(f).get("order_count", 0)
+    if stats_orders != acked_total:
+        return [f"매출 집계 주문 수 {stats_orders}, 확인된 주문 {acked_total}건"]
+    return []
+
+
+def check_integrity(sessions, check_stats=True):
+    import user_store
+
+    problems = []
+    db = user_store.load_users(user_store.DEFAULT_DIR)
+
+    acked_total = sum(s.acked_orders for s in sessions)
+    stored_total = 0
+    order_ids = []
+    for s in sessions:
+        stored = db.get(s.phone)
+        if stored is None:
+            problems.append(f"{s.phone}: 고객 레코드 유실")
+            continue
+        stored_orders = stored.get("orders", [])
+        stored_total += len(stored_orders)
+        order_ids += [o.get("id") for o in stored_orders]
+        if len(stored_orders) != s.acked_orders:
+            problems.append(f"{s.phone}: 확인된 주문 {s.acked_orders}건, 저장된 주문 {len(stored_orders)}건")
+        view = s.at.session_state.user if s.at.session_state.logged_in else {}
+        for field in ("stamps", "coupon_count", "coupon_amount"):
+            if view and view.get(field) != stored.get(field):
+                problems.append(f"{s.phone}: {field} 세션={view.get(field)} 파일={stored.get(field)}")
+        earned = sum(int(o.get("stamps_earned", 0) or 0) for o in stored_orders)
+        if earned != len(stored_orders):
+            problems.append(f"{s.phone}: 적립 스탬프 합계 {earned} != 주문 수 {len(stored_orders)}")
+
+    duplicates = len(order_ids) - len(set(order_ids))
+    if duplicates:
+        problems.append(f"중복 주문번호 {duplicates}건")
+    if len(StubSMTP.sent) != acked_total:
+        problems.append(f"알림 메일 {len(StubSMTP.sent)}건, 확인된 주문 {acked_total}건")
+    # 여러 프로세스 실행 시에는 모든 복제 프로세스가 끝난 뒤 상위 프로세스에서 비교합니다.
+    if check_stats:
+        problems += stats_problems(acked_total)
+
+    return {
+        "acked_orders": acked_total,
+        "stored_orders": stored_total,
+        "lost_orders": max(0, acked_total - stored_total),
+        "duplicate_order_ids": duplicates,
+        "emails_sent": len(StubSMTP.sent),
+        "problems": problems,
+    }
+
+
+def run_replicas(args, workdir, phones, json_path):
+    """세션을 복제 프로세스들에 나눠 동시에 실행하고 결과를 합칩니다."""
+    groups = [phones[i :: args.replicas] for i in range(args.replicas)]
+    procs = []
+    started = time.perf_counter()
+    for i, group in enumerate(groups):
+        if not group:
+            continue
+        out = os.path.join(workdir, f"replica_{i}.json")
+        cmd = [
+            sys.executable, os.path.abspath(__file__), "--workdir", workdir, "--phones", ",".join(group),
+            "--orders", str(args.orders), "--think", str(args.think), "--seed", str(args.seed + i),
+            "--json", out, "--no-memory", "--replicas", "1",
+        ]
+        procs.append((out, subprocess.Popen(cmd, stdout=subprocess.DEVNULL)))
+    for _, proc in procs:
+        proc.wait()
+    elapsed = time.perf_counter() - started
+
+    replicas = []
+    for out, proc in procs:
+        if not os.path.exists(out):
+            replicas.append({"returncode": proc.returncode, "integrity": {"acked_orders": 0, "stored_orders": 0,
+                             "problems": ["복제 프로세스 결과 없음"]}, "session_errors": []})
+            continue
+        with open(out, "r", encoding="utf-8") as f:
+            replicas.append(json.load(f))
+
+    acked = sum(r["integrity"]["acked_orders"] for r in replicas)
+    stored = sum(r["integrity"]["stored_orders"] for r in replicas)
+    problems = [p for r in replicas for p in r["integrity"]["problems"]]
+    problems += stats_problems(acked)
+    report = {
+        "mode": "multi-process (concurrent)",
+        "replicas": len(replicas),
+        "sessions": len(phones),
+        "elapsed_s": round(elapsed, 3),
+        "reruns_per_s": round(sum(r.get("reruns", 0) for r in replicas) / elapsed, 2) if elapsed else 0.0,
+        "orders_per_s": round(acked / elapsed, 3) if elapsed else 0.0,
+        # 각 복제 프로세스 안의 세션은 직렬화되므로 분위수는 프로세스 안의 순차 리런 지연입니다.
+        "latency_p95_ms_by_replica": [r.get("latency_ms", {}).get("p95") for r in replicas],
+        "session_errors": [e for r in replicas for e in r["session_errors"]],
+        "integrity": {
+            "acked_orders": acked,
+            "stored_orders": stored,
+            "lost_orders": max(0, acked - stored),
+            "problems": problems,
+        },
+        "workdir": workdir,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if problems or report["session_errors"] else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AppTest 기반 동시 세션 부하 테스트")
+    parser.add_argument("--sessions", type=int, default=10, help="동시 세션 수")
+    parser.add_argument("--orders", type=int, default=2, help="세션당 주문 수")
+    parser.add_argument("--think", type=float, default=0.05, help="단계 사이 최대 대기 시간(초)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="데이터 파일을 만들 폴더 (기본: 임시 폴더)")
+    parser.add_argument("--json", help="결과를 JSON 으로 저장할 경로")
+    parser.add_argument("--no-memory", action="store_true", help="tracemalloc 메모리 측정 생략")
+    parser.add_argument("--replicas", type=int, default=DEFAULT_REPLICAS,
+                        help="같은 데이터를 공유하는 앱 프로세스 수 (1 이면 순차 처리 용량만 측정)")
+    parser.add_argument("--phones", help=argparse.SUPPRESS)  # 복제 프로세스에 나눠 준 전화번호 목록
+    args = parser.parse_args(argv)
+
+    json_path = os.path.abspath(args.json) if args.json else None
+    workdir = prepare_workdir(args.workdir)
+    os.chdir(workdir)
+    sys.path.insert(0, APP_DIR)
+    smtplib.SMTP_SSL = StubSMTP
+
+    rng = random.Random(args.seed)
+    if args.phones:
+        phones = args.phones.split(",")
+    else:
+        phones = [f"{n:04d}" for n in rng.sample(range(10000), args.sessions)]
+    if args.replicas > 1:
+        return run_replicas(args, workdir, phones, json_path)
+
+    if not args.no_memory:
+        tracemalloc.start()
+        # 모듈 임포트/메뉴 캐시 등 1회성 비용은 세션당 메모리에서 제외
+        warm = Session("0000" if "0000" not in phones else "9999", 0, 0, random.Random(0))
+        warm.login()
+        del warm
+        mem_base = tracemalloc.get_traced_memory()[0]
+
+    sessions = [Session(p, args.orders, args.think, random.Random(rng.random())) for p in phones]
+    threads = [threading.Thread(target=s.run, name=f"session-{s.phone}") for s in sessions]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    mem_per_session = None
+    if not args.no_memory:
+        mem_per_session = (tracemalloc.get_traced_memory()[0] - mem_base) / max(1, len(sessions))
+        tracemalloc.stop()
+
+    latencies = [sec for s in sessions for _, sec in s.latencies]
+    by_step = {}
+    for s in sessions:
+        for name, sec in s.latencies:
+            by_step.setdefault(name, []).append(sec)
+
+    # 매출 집계 등 기다리지 않고 모아 기록하는 변경을 모두 반영한 뒤 확인합니다.
+    import group_commit
+    group_commit.flush_all()
+    integrity = check_integrity(sessions, check_stats=not args.phones)
+    report = {
+        "mode": SEQUENTIAL_MODE,
+        "sessions": len(sessions),
+        "elapsed_s": round(elapsed, 3),
+        "reruns": len(latencies),
+        "reruns_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "orders_per_s": round(integrity["acked_orders"] / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "max": round(max(latencies, default=0) * 1000, 1),
+        },
+        "latency_by_step_ms": {
+            name: {
+                "count": len(v),
+                "mean": round(statistics.fmean(v) * 1000, 1),
+                "p95": round(percentile(v, 95) * 1000, 1),
+            }
+            for name, v in sorted(by_step.items())
+        },
+        "memory_per_session_kb": round(mem_per_session / 1024, 1) if mem_per_session is not None else None,
+        "session_errors": [f"{s.phone} {e}" for s in sessions for e in s.errors],
+        "integrity": integrity,
+        "workdir": workdir,
+    }
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if integrity["problems"] or report["session_errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
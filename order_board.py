@@ -0,0 +1,123 @@
+"""사장님 주문 현황판용 프로세스 간 공유 채널 (로컬 이벤트 로그 파일).
+
+주문이 커밋되면 publish 로 현황판에 올라가고(order_key 기준), 상태는 접수 → 준비중 →
+완료 순서로 바뀝니다. 모든 변경은 BOARD_FILE 에 한 줄짜리 이벤트로 덧붙여지며, 각 앱
+프로세스는 마지막으로 읽은 위치 이후의 줄만 읽어 자기 사본에 반영합니다. 따라서 여러
+프로세스로 띄워도 어느 프로세스의 현황판이든 모든 주문을 보여주며, 고객 데이터 파일은
+전혀 읽지 않습니다.
+
+로그가 COMPACT_BYTES 를 넘으면 현재 목록만 담은 새 파일로 교체하고, 다른 프로세스는
+파일이 바뀐 것(inode)을 보고 처음부터 다시 읽습니다. 현황판은 일시적인 상태이므로
+fsync 하지 않습니다.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import filestore
+
+BOARD_FILE = "order_board.jsonl"
+STATUSES = ("접수", "준비중", "완료")
+MAX_BOARD_ORDERS = 200  # 현황판에 보관할 최대 주문 수 (초과 시 완료된 주문부터 제거)
+COMPACT_BYTES = 256 * 1024  # 이벤트 로그가 이 크기를 넘으면 현재 목록만 남기고 새로 씀
+
+
+class OrderBoard:
+    def __init__(self, path=BOARD_FILE, max_orders=MAX_BOARD_ORDERS):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.max_orders = max_orders
+        self._lock = threading.Lock()
+        self._orders = OrderedDict()  # order_key -> 주문 + status (오래된 순)
+        self._file_id = None  # 마지막으로 읽은 로그의 (inode, 크기)
+        self._offset = 0
+
+    def _apply(self, event):
+        if event["op"] == "publish":
+            entry = event["order"]
+            self._orders[entry["order_key"]] = entry
+            self._trim()
+        elif event["op"] == "status":
+            entry = self._orders.get(event["order_key"])
+            if entry is not None:
+                entry["status"] = event["status"]
+                entry["updated_at"] = event["at"]
+
+    def _trim(self):
+        while len(self._orders) > self.max_orders:
+            done = next((k for k, o in self._orders.items() if o["status"] == STATUSES[-1]), None)
+            self._orders.pop(done if done is not None else next(iter(self._orders)))
+
+    def _sync(self):
+        """로그에서 아직 읽지 않은 이벤트를 반영합니다. _lock 안에서 호출."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if (st.st_ino, st.st_size) == self._file_id:
+            return
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            if self._file_id is None or st.st_ino != self._file_id[0] or st.st_size < self._offset:
+                # 처음 읽거나 다른 프로세스가 로그를 새로 썼으면 처음부터 다시 읽습니다.
+                self._orders.clear()
+                self._offset = 0
+            f.seek(self._offset)
+            data = f.read(st.st_size - self._offset)
+        # 다른 프로세스가 아직 쓰는 중인 마지막 줄은 다음에 읽습니다.
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                self._apply(json.loads(line))
+            except (ValueError, KeyError, TypeError):
+                continue
+        self._offset += end
+        self._file_id = (st.st_ino, self._offset)
+
+    def _append(self, event):
+        """이벤트 한 줄을 덧붙입니다. _lock 과 파일 잠금 안에서 호출."""
+        with open(self.path, "ab") as f:
+            f.write((json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+        self._sync()
+        if self._offset >= COMPACT_BYTES:
+            with filestore.atomic_open(self.path, durable=False) as f:
+                for entry in self._orders.values():
+                    f.write(json.dumps({"op": "publish", "order": entry}, ensure_ascii=False) + "\n")
+            self._sync()
+
+    def publish(self, order):
+        entry = dict(order, status=STATUSES[0], updated_at=time.time())
+        with self._lock, filestore.file_lock(self.lock_path):
+            self._append({"op": "publish", "order": entry})
+
+    def advance(self, order_key):
+        """다음 상태로 전환하고 새 상태를 반환 (이미 완료이거나 없으면 None).
+
+        다른 프로세스의 전환과 겹치지 않도록 파일 잠금 아래에서 최신 상태를 확인합니다.
+        """
+        with self._lock, filestore.file_lock(self.lock_path):
+            self._sync()
+            entry = self._orders.get(order_key)
+            if entry is None or entry["status"] == STATUSES[-1]:
+                return None
+            status = STATUSES[STATUSES.index(entry["status"]) + 1]
+            self._append({"op": "status", "order_key": order_key, "status": status, "at": time.time()})
+            return status
+
+    def status(self, order_key):
+        with self._lock:
+            self._sync()
+            entry = self._orders.get(order_key)
+            return entry["status"] if entry else None
+
+    def snapshot(self):
+        """최신 주문부터 정렬된 사본 목록."""
+        with self._lock:
+            self._sync()
+            return [dict(o) for o in reversed(self._orders.values())]
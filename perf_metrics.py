@@ -0,0 +1,217 @@
+"""리런 단계별 실행 시간 계측 및 Prometheus 텍스트 포맷 내보내기.
+
+환경 변수
+- LUCY_METRICS=0       : 계측 비활성화 (데코레이터는 원본 함수를 그대로 반환)
+- LUCY_METRICS_FILE    : 지정 시 해당 경로에 Prometheus 텍스트를 주기적으로 기록
+- LUCY_METRICS_PORT    : 지정 시 127.0.0.1:<포트>/metrics 엔드포인트 제공
+"""
+import os
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+import filestore
+
+ENABLED = os.environ.get("LUCY_METRICS", "1").strip().lower() not in ("0", "false", "off", "no")
+METRICS_FILE = os.environ.get("LUCY_METRICS_FILE", "")
+METRICS_PORT = int(os.environ.get("LUCY_METRICS_PORT", "0") or 0)
+FILE_EXPORT_INTERVAL = 5.0  # 파일 내보내기 최소 간격 (초)
+
+# 히스토그램 버킷 경계 (초)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+METRIC_NAME = "lucy_phase_seconds"
+
+_NULL_TIMER = nullcontext()
+
+
+class Histogram:
+    """누적 버킷 카운트 + 합계 + 개수 (Prometheus histogram 과 동일한 구조)."""
+
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.total += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        out, acc = [], 0
+        for c in self.counts:
+            acc += c
+            out.append(acc)
+        return out
+
+    def quantile(self, q):
+        """버킷 경계 기준 근사 분위수 (해당 분위가 속한 버킷의 상한)."""
+        if self.count == 0:
+            return 0.0
+        target = q * self.count
+        for bound, acc in zip(self.buckets, self.cumulative()):
+            if acc >= target:
+                return bound
+        return float("inf")
+
+
+class PhaseMetrics:
+    """단계(phase) 이름별 히스토그램 저장소. 여러 세션 스레드에서 공유됩니다."""
+
+    def __init__(self, buckets=BUCKETS):
+        self._buckets = buckets
+        self._lock = threading.Lock()
+        self._hists = {}
+        self._last_file_export = 0.0
+
+    def observe(self, phase, seconds):
+        with self._lock:
+            hist = self._hists.get(phase)
+            if hist is None:
+                hist = self._hists[phase] = Histogram(self._buckets)
+            hist.observe(seconds)
+
+    def summary(self):
+        """디버그 패널용 요약 행 목록."""
+        with self._lock:
+            rows = []
+            for phase in sorted(self._hists):
+                h = self._hists[phase]
+                rows.append({
+                    "phase": phase,
+                    "count": h.count,
+                    "avg_ms": round(h.total / h.count * 1000, 2) if h.count else 0.0,
+                    "p50_ms": h.quantile(0.5) * 1000,
+                    "p95_ms": h.quantile(0.95) * 1000,
+                    "total_s": round(h.total, 4),
+                })
+            return rows
+
+    def render_prometheus(self):
+        """Prometheus 텍스트 노출 포맷(0.0.4)으로 직렬화."""
+        lines = [
+            f"# HELP {METRIC_NAME} Time spent in each app phase per rerun.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        with self._lock:
+            for phase in sorted(self._hists):
+                h = self._hists[phase]
+                label = phase.replace("\\", "\\\\").replace('"', '\\"')
+                for bound, acc in zip(h.buckets, h.cumulative()):
+                    lines.append(f'{METRIC_NAME}_bucket{{phase="{label}",le="{bound}"}} {acc}')
+                lines.append(f'{METRIC_NAME}_bucket{{phase="{label}",le="+Inf"}} {h.count}')
+                lines.append(f'{METRIC_NAME}_sum{{phase="{label}"}} {h.total:.6f}')
+                lines.append(f'{METRIC_NAME}_count{{phase="{label}"}} {h.count}')
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path):
+        """임시 파일에 쓴 뒤 교체하여 수집기가 반쯤 쓰인 파일을 읽지 않도록 합니다."""
+        with filestore.atomic_open(path, durable=False) as f:
+            f.write(self.render_prometheus())
+
+    def maybe_export(self, now=None):
+        """LUCY_METRICS_FILE 이 설정된 경우 최소 간격마다 파일로 내보냅니다."""
+        if not METRICS_FILE:
+            return
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if now - self._last_file_export < FILE_EXPORT_INTERVAL:
+                return
+            self._last_file_export = now
+        try:
+            self.write_file(METRICS_FILE)
+        except OSError:
+            pass
+
+    def reset(self):
+        with self._lock:
+            self._hists.clear()
+
+
+REGISTRY = PhaseMetrics()
+
+
+class _Timer:
+    __slots__ = ("phase", "start")
+
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        # st.rerun()/st.stop() 은 예외로 흐름을 끊으므로 예외 시에도 기록합니다.
+        REGISTRY.observe(self.phase, time.perf_counter() - self.start)
+        return False
+
+
+def timer(phase):
+    """`with timer("phase"):` 형태의 구간 계측. 비활성화 시 공용 no-op 컨텍스트를 반환."""
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(phase)
+
+
+def timed(phase=None):
+    """함수 계측 데코레이터. 비활성화 시 원본 함수를 그대로 돌려줘 오버헤드가 없습니다."""
+    def decorator(func):
+        if not ENABLED:
+            return func
+        name = phase or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                REGISTRY.observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+_server_lock = threading.Lock()
+_server = None
+
+
+def start_http_server(port=METRICS_PORT, host="127.0.0.1"):
+    """로컬 /metrics 엔드포인트를 데몬 스레드로 한 번만 띄웁니다."""
+    global _server
+    if not ENABLED or not port:
+        return None
+    with _server_lock:
+        if _server is not None:
+            return _server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = REGISTRY.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            _server = ThreadingHTTPServer((host, port), _Handler)
+        except OSError:
+            # 다른 프로세스가 이미 포트를 점유한 경우 엔드포인트 없이 계속 진행
+            return None
+        threading.Thread(target=_server.serve_forever, name="lucy-metrics", daemon=True).start()
+        return _server
@@ -0,0 +1,194 @@
+"""주문 기반 인기도 점수 (지수 시간 감쇠).
+
+주문이 완료될 때마다 상품별 판매 수량을 감쇠 카운터에 더하고, 추천 스코어링에서는
+상품 유형별 최댓값 대비 비율로 환산한 가산점을 사용합니다. 카운터 파일은 여러 앱
+프로세스가 잠금 아래에서 최신 내용을 다시 읽어 갱신하며, 각 프로세스는 FLUSH_SECONDS
+동안 모인 주문을 한 번에 반영합니다.
+
+    python popularity.py rebuild [--data user_shards] [--out popularity.json]
+"""
+import argparse
+import math
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import filestore
+import group_commit
+import user_store
+from sales_stats import claim_order, item_key, iter_orders, latest_order_keys, name_key
+
+POPULARITY_FILE = "popularity.json"
+HALF_LIFE_HOURS = 72        # 판매 기록의 영향력이 절반으로 줄어드는 시간
+MAX_TRACKED_ITEMS = 512     # 카운터 최대 보관 개수 (초과 시 점수가 가장 낮은 항목 제거)
+BONUS_CACHE_SECONDS = 60    # 감쇠 반영 주기 (같은 버전이면 이 시간 동안 캐시 사용)
+FLUSH_SECONDS = 1.0         # 주문을 모아 카운터 파일에 반영하는 주기 (초)
+
+
+def order_timestamp(order):
+    try:
+        return datetime.strptime(str(order.get("date", "")), "%Y-%m-%d %H:%M:%S").timestamp()
+    except ValueError:
+        return time.time()
+
+
+class DecayedCounter:
+    """키별 (점수, 마지막 갱신 시각) 을 보관하는 용량 제한 감쇠 카운터."""
+
+    def __init__(self, half_life_hours=HALF_LIFE_HOURS, capacity=MAX_TRACKED_ITEMS):
+        self.decay_rate = math.log(2) / (half_life_hours * 3600)
+        self.capacity = capacity
+        self._entries = {}  # key -> [score, ts]
+
+    def _decayed(self, entry, ts):
+        score, last = entry
+        return score * math.exp(-self.decay_rate * max(0.0, ts - last))
+
+    def add(self, key, amount, ts):
+        entry = self._entries.get(key)
+        if entry is None:
+            self._entries[key] = [float(amount), ts]
+            if len(self._entries) > self.capacity:
+                self._evict(ts)
+            return
+        if ts >= entry[1]:
+            entry[0] = self._decayed(entry, ts) + amount
+            entry[1] = ts
+        else:
+            # 과거 주문(백필)은 현재 기준 시각으로 감쇠시켜 더합니다.
+            entry[0] += amount * math.exp(-self.decay_rate * (entry[1] - ts))
+
+    def _evict(self, ts):
+        weakest = min(self._entries, key=lambda k: self._decayed(self._entries[k], ts))
+        del self._entries[weakest]
+
+    def score(self, key, ts):
+        entry = self._entries.get(key)
+        return self._decayed(entry, ts) if entry else 0.0
+
+    def to_dict(self):
+        return {k: list(v) for k, v in self._entries.items()}
+
+    def load(self, data):
+        self._entries = {k: [float(v[0]), float(v[1])] for k, v in data.items()}
+        while len(self._entries) > self.capacity:
+            self._evict(time.time())
+
+
+def record_into(counter, order):
+    ts = order_timestamp(order)
+    for it in order.get("items", []) or []:
+        if isinstance(it, dict):
+            counter.add(item_key(it), int(it.get("qty", 1) or 1), ts)
+
+
+def _record_new(state, order):
+    counter, recent = state
+    if claim_order(recent, order):
+        record_into(counter, order)
+
+
+class PopularityTracker:
+    """프로세스 간 공유되는 인기도 카운터 파일과 메뉴 버전별 가산점 캐시.
+
+    record_order 는 주문을 큐에 넣고 바로 돌아오며, 기록 스레드가 모인 주문을 잠금 아래에서
+    카운터를 한 번만 만들어 반영하고 파일을 한 번 씁니다.
+    """
+
+    def __init__(self, path=POPULARITY_FILE, half_life_hours=HALF_LIFE_HOURS, capacity=MAX_TRACKED_ITEMS,
+                 flush_seconds=FLUSH_SECONDS):
+        self.path = path
+        self.half_life_hours = half_life_hours
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._file = filestore.JsonFile(path)
+        self._counter = DecayedCounter(half_life_hours, capacity)
+        self._loaded = None
+        self._version = 0
+        self._bonus_cache = {}
+        self._committer = group_commit.GroupCommitter(self._transaction, window=flush_seconds, name="lucy-popularity")
+
+    def _new_counter(self, entries=None):
+        counter = DecayedCounter(self.half_life_hours, self.capacity)
+        if entries:
+            try:
+                counter.load(entries)
+            except (TypeError, ValueError, IndexError):
+                pass
+        return counter
+
+    def _current(self):
+        """파일이 바뀌었으면 (다른 프로세스의 주문 포함) 카운터를 다시 읽습니다. _lock 안에서 호출."""
+        data = self._file.read()
+        if data is not self._loaded:
+            self._counter = self._new_counter(data.get("items"))
+            self._loaded = data
+            self._version += 1
+            self._bonus_cache.clear()
+        return self._counter
+
+    @contextmanager
+    def _transaction(self):
+        """잠금 아래에서 최신 카운터를 한 번 만들어 (카운터, 최근 order_key) 로 넘겨주고 기록합니다."""
+        with self._file.transaction() as data:
+            counter = self._new_counter(data.get("items"))
+            recent = data.setdefault("recent_order_keys", [])
+            yield counter, recent
+            data["items"] = counter.to_dict()
+
+    def record_order(self, order):
+        self._committer.post(lambda state: _record_new(state, order))
+
+    def flush(self, timeout=None):
+        """큐에 남은 주문이 파일에 반영될 때까지 기다립니다."""
+        return self._committer.flush(timeout)
+
+    def rebuild(self, records):
+        """주문 내역으로 카운터를 다시 만듭니다. records 는 잠금을 잡은 뒤에 읽습니다 (SalesStats.rebuild 참고)."""
+        with self._file.transaction() as data:
+            counter = self._new_counter()
+            keyed = []
+            for order in iter_orders(records):
+                record_into(counter, order)
+                if order.get("order_key"):
+                    keyed.append((str(order.get("date", "")), order["order_key"]))
+            data.clear()
+            data.update(items=counter.to_dict(), recent_order_keys=latest_order_keys(keyed))
+
+    def bonus_scores(self, menu_version, items, max_bonus, now=None):
+        """item_id -> 가산점 (0 ~ max_bonus). items 는 item_id -> 상품명 매핑.
+
+        카운터는 상품명 키로 쌓이므로 메뉴 행 순서가 바뀌어도 같은 상품의 점수를 찾습니다.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            counter = self._current()
+            cache_key = (menu_version, self._version, int(now // BONUS_CACHE_SECONDS))
+            cached = self._bonus_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            raw = {item_id: counter.score(name_key(name), now) for item_id, name in items.items()}
+            top = max(raw.values(), default=0.0)
+            bonus = {k: round(max_bonus * v / top, 2) for k, v in raw.items() if v > 0} if top > 0 else {}
+            # 메뉴 버전(유형별)마다 최신 결과 하나만 보관
+            self._bonus_cache = {k: v for k, v in self._bonus_cache.items() if k[1:] == cache_key[1:]}
+            self._bonus_cache[cache_key] = bonus
+            return bonus
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="주문 기반 인기도 도구")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="기존 주문 내역으로 인기도 카운터를 다시 생성")
+    rebuild.add_argument("--data", default=user_store.DEFAULT_DIR, help="샤드 디렉터리 또는 예전 단일 JSON 파일")
+    rebuild.add_argument("--out", default=POPULARITY_FILE)
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild":
+        PopularityTracker(args.out).rebuild(user_store.iter_users(args.data))
+        print(f"인기도 카운터를 생성했습니다: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
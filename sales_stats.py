@@ -0,0 +1,225 @@
+"""주문 완료 시점에 갱신되는 매출 집계 (사장님 매출 분석 페이지용).
+
+집계는 DATA_FILE 과 별도의 작은 JSON 파일에 저장되며, 기존 주문 내역으로부터
+다시 만들 수 있습니다. 여러 앱 프로세스가 같은 파일을 잠금 아래에서 갱신하며, 각 프로세스는
+FLUSH_SECONDS 동안 모인 주문을 한 번에 반영합니다.
+
+    python sales_stats.py rebuild [--data user_shards] [--out sales_stats.json]
+"""
+import argparse
+from datetime import datetime, timedelta
+
+import filestore
+import group_commit
+import user_store
+
+STATS_FILE = "sales_stats.json"
+NO_DISCOUNT = "None"  # 할인 미적용 주문의 discount_type 키
+HOURLY_RETENTION_DAYS = 7  # 시간대별 매출 보관 기간 (이전 시간대는 일별 매출에만 남음)
+DASHBOARD_DAYS = 30        # 사장님 페이지 일별 매출 차트 기간
+FLUSH_SECONDS = 1.0        # 주문 집계를 모아 파일에 반영하는 주기 (초)
+RECENT_ORDER_KEYS = 512    # 중복 반영을 막기 위해 보관하는 최근 order_key 수
+
+
+def empty_stats():
+    return {
+        "order_count": 0,
+        "revenue_total": 0,
+        "discount_total": 0,
+        "stamps_issued": 0,
+        "revenue_by_hour": {},   # "YYYY-MM-DD HH" -> 최종 결제 금액 합계
+        "revenue_by_day": {},    # "YYYY-MM-DD" -> 최종 결제 금액 합계
+        "orders_by_day": {},     # "YYYY-MM-DD" -> 주문 수
+        "units_by_item": {},     # 상품 키(상품명) -> 판매 수량
+        "coupon_usage": {},      # discount_type -> {"count": n, "amount": 할인액}
+        "recent_order_keys": [], # 최근 반영한 order_key (재생성과 겹친 주문을 한 번만 반영)
+    }
+
+
+def name_key(name):
+    """상품명으로 만든 집계 키 (공백 정리)."""
+    return " ".join(str(name or "상품").split())
+
+
+def item_key(item):
+    """상품 집계 키 (매출/인기도/개인화 공용).
+
+    item_id 는 메뉴 CSV 의 행 번호라 메뉴를 고치거나 순서를 바꾸면 다른 상품을 가리키므로,
+    저장되는 집계는 상품명으로 묶습니다.
+    """
+    return name_key(item.get("name"))
+
+
+def apply_order(stats, order):
+    """주문 1건을 집계에 반영 (O(주문 상품 수))."""
+    date = str(order.get("date", ""))
+    day, hour = date[:10], date[:13]
+    final_total = int(order.get("final_total", order.get("total", 0)) or 0)
+
+    stats["order_count"] += 1
+    stats["revenue_total"] += final_total
+    stats["discount_total"] += int(order.get("discount_amount", 0) or 0)
+    stats["stamps_issued"] += int(order.get("stamps_earned", 0) or 0)
+    if day:
+        stats["revenue_by_day"][day] = stats["revenue_by_day"].get(day, 0) + final_total
+        stats["orders_by_day"][day] = stats["orders_by_day"].get(day, 0) + 1
+    if len(hour) == 13:
+        by_hour = stats["revenue_by_hour"]
+        if hour not in by_hour and len(by_hour) >= HOURLY_RETENTION_DAYS * 24:
+            prune_hourly(stats)
+        by_hour[hour] = by_hour.get(hour, 0) + final_total
+
+    for it in order.get("items", []) or []:
+        if not isinstance(it, dict):
+            continue
+        key = item_key(it)
+        stats["units_by_item"][key] = stats["units_by_item"].get(key, 0) + int(it.get("qty", 1) or 1)
+
+    usage = stats["coupon_usage"].setdefault(order.get("discount_type") or NO_DISCOUNT, {"count": 0, "amount": 0})
+    usage["count"] += 1
+    usage["amount"] += int(order.get("discount_amount", 0) or 0)
+    return stats
+
+
+def claim_order(recent, order):
+    """처음 보는 order_key 면 recent 에 기록하고 True, 이미 반영한 주문이면 False."""
+    key = order.get("order_key")
+    if not key:
+        return True
+    if key in recent:
+        return False
+    recent.append(key)
+    del recent[:-RECENT_ORDER_KEYS]
+    return True
+
+
+def record_new_order(stats, order):
+    if claim_order(stats["recent_order_keys"], order):
+        apply_order(stats, order)
+
+
+def iter_orders(records):
+    """(전화번호 뒷자리, 레코드) 목록의 주문을 하나씩."""
+    for _, user in records:
+        if not isinstance(user, dict):
+            continue
+        for order in user.get("orders", []) or []:
+            if isinstance(order, dict):
+                yield order
+
+
+def latest_order_keys(keyed):
+    """(주문 시각, order_key) 목록에서 가장 최근 RECENT_ORDER_KEYS 개의 order_key."""
+    return [key for _, key in sorted(keyed)[-RECENT_ORDER_KEYS:]]
+
+
+def prune_hourly(stats, keep_days=HOURLY_RETENTION_DAYS):
+    """가장 최근 시간대 기준 keep_days 일보다 오래된 시간대별 매출을 버립니다.
+
+    해당 매출은 revenue_by_day 에 이미 합산되어 있습니다.
+    """
+    by_hour = stats["revenue_by_hour"]
+    if not by_hour:
+        return
+    try:
+        latest = datetime.strptime(max(by_hour)[:10], "%Y-%m-%d")
+    except ValueError:
+        return
+    cutoff = (latest - timedelta(days=keep_days - 1)).strftime("%Y-%m-%d")
+    for key in [k for k in by_hour if k < cutoff]:
+        del by_hour[key]
+
+
+def build_from_users(records):
+    """전체 주문 내역 ((전화번호 뒷자리, 레코드) 목록) 으로부터 집계를 새로 계산 (백필용)."""
+    stats = empty_stats()
+    keyed = []
+    for order in iter_orders(records):
+        apply_order(stats, order)
+        if order.get("order_key"):
+            keyed.append((str(order.get("date", "")), order["order_key"]))
+    stats["recent_order_keys"] = latest_order_keys(keyed)
+    prune_hourly(stats)
+    return stats
+
+
+def with_defaults(data):
+    stats = empty_stats()
+    stats.update(data)
+    return stats
+
+
+class SalesStats:
+    """앱 프로세스들이 공유하는 매출 집계.
+
+    record_order 는 주문을 큐에 넣고 바로 돌아오며, 프로세스당 하나인 기록 스레드가
+    flush_seconds 동안 모인 주문을 파일 잠금 아래에서 최신 집계에 한 번에 반영합니다.
+    따라서 주문마다 프로세스 간 잠금이나 fsync 를 기다리지 않고, 다른 프로세스의 주문도
+    덮어쓰지 않습니다. 반영 전에 프로세스가 비정상 종료되면 그 주문들은 집계에서 빠지므로
+    rebuild 로 다시 만듭니다. 읽기는 파일이 바뀌었을 때만 다시 읽습니다.
+    """
+
+    def __init__(self, path=STATS_FILE, flush_seconds=FLUSH_SECONDS):
+        self.path = path
+        self._file = filestore.JsonFile(path, normalize=with_defaults)
+        self._committer = group_commit.GroupCommitter(self._file.transaction, window=flush_seconds, name="lucy-sales-stats")
+
+    def record_order(self, order):
+        self._committer.post(lambda stats: record_new_order(stats, order))
+
+    def flush(self, timeout=None):
+        """큐에 남은 주문이 파일에 반영될 때까지 기다립니다."""
+        return self._committer.flush(timeout)
+
+    def rebuild(self, records):
+        """주문 내역으로 집계를 다시 만듭니다. records 는 집계 잠금을 잡은 뒤에 읽는 이터레이터입니다.
+
+        읽는 동안 커밋된 주문은 기록 스레드가 잠금이 풀린 뒤 반영하고, 그중 이미 읽힌
+        주문은 recent_order_keys 로 걸러지므로 빠지거나 두 번 세어지지 않습니다.
+        """
+        with self._file.transaction() as data:
+            stats = build_from_users(records)
+            data.clear()
+            data.update(stats)
+        return stats
+
+    def snapshot(self, today=None, days=DASHBOARD_DAYS):
+        """사장님 페이지에 필요한 값만 복사합니다 (최근 days 일, 오늘 시간대별).
+
+        복사량은 메뉴 수와 days 에만 비례하며 누적 기간과는 무관합니다.
+        """
+        today = today or datetime.now().strftime("%Y-%m-%d")
+        start = datetime.strptime(today, "%Y-%m-%d")
+        day_keys = [(start - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days - 1, -1, -1)]
+        hour_keys = [f"{today} {h:02d}" for h in range(24)]
+        s = self._file.read()
+        return {
+            "order_count": s["order_count"],
+            "revenue_total": s["revenue_total"],
+            "discount_total": s["discount_total"],
+            "stamps_issued": s["stamps_issued"],
+            "today_revenue": s["revenue_by_day"].get(today, 0),
+            "today_orders": s["orders_by_day"].get(today, 0),
+            "revenue_by_day": {d: s["revenue_by_day"].get(d, 0) for d in day_keys},
+            "revenue_by_hour": {h: s["revenue_by_hour"].get(h, 0) for h in hour_keys},
+            "units_by_item": dict(s["units_by_item"]),
+            "coupon_usage": {k: dict(v) for k, v in s["coupon_usage"].items()},
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="매출 집계 도구")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="기존 주문 내역으로 집계 파일을 다시 생성")
+    rebuild.add_argument("--data", default=user_store.DEFAULT_DIR, help="샤드 디렉터리 또는 예전 단일 JSON 파일")
+    rebuild.add_argument("--out", default=STATS_FILE)
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild":
+        # 실행 중인 앱 프로세스와 같은 잠금 아래에서 읽고 교체합니다.
+        stats = SalesStats(args.out).rebuild(user_store.iter_users(args.data))
+        print(f"{stats['order_count']}건의 주문으로 집계를 생성했습니다: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""전화번호 뒷자리 기준으로 나눈 고객 데이터 저장소 (여러 앱 프로세스 공용).
+
+- 고객 레코드는 <디렉터리>/users_NN/<전화번호 뒷자리>.json 에 고객마다 한 파일로 저장되며,
+  NN(샤드)은 전화번호로 계산합니다.
+- 각 프로세스는 샤드마다 GroupCommitter 를 하나씩 두어 변경을 배치로 모읍니다. 배치는
+  <디렉터리>/users_NN.lock 의 배타적 flock 아래에서 바뀐 고객 레코드를 모두 임시 파일로
+  쓴 뒤, 같은 레코드들을 샤드 커밋 로그(users_NN.log)에 한 줄로 덧붙이고 fsync 하는 순간
+  커밋됩니다. 배치당 fsync 는 한 번이며, 배치는 통째로 반영되거나 전혀 반영되지 않습니다.
+- 커밋된 배치의 임시 파일은 fsync 없이 고객 파일로 교체됩니다. 로그가 LOG_CHECKPOINT_BYTES 를
+  넘으면 로그의 고객 파일을 fsync 한 뒤 로그를 비우고(체크포인트), 비정상 종료 후 처음 여는
+  프로세스는 로그를 다시 반영해 고객 파일을 복구합니다.
+- 여러 프로세스가 같은 고객을 갱신해도 잠금 아래에서 고객 파일을 새로 읽으므로 서로의 변경을
+  덮어쓰지 않습니다. 프로세스가 죽으면 잠금은 자동으로 풀립니다.
+- 읽기는 고객 파일 하나만 읽으므로 비용이 전체 고객 수와 무관합니다.
+
+처음 실행 시 예전 단일 파일(user_data.json)이 있으면 고객별 파일로 나눠 옮깁니다.
+
+LoginIndex 는 로그인 확인에 필요한 전화번호 뒷자리 → 비밀번호만 프로세스 전체가 공유하도록
+모아 둔 인덱스입니다. 레코드 위치(샤드, 파일 이름)는 전화번호로 계산되므로 따로 저장하지 않습니다.
+"""
+import glob
+import json
+import os
+import sys
+import threading
+import zlib
+from contextlib import contextmanager
+from urllib.parse import quote, unquote
+
+import filestore
+import group_commit
+from filestore import file_lock
+from perf_metrics import timed
+
+DEFAULT_DIR = "user_shards"
+DEFAULT_SHARDS = 4
+META_FILE = "_meta.json"
+LOG_CHECKPOINT_BYTES = 4 * 1024 * 1024  # 샤드 커밋 로그가 이 크기를 넘으면 체크포인트
+
+
+def shard_index(phone, n_shards):
+    phone = str(phone)
+    if phone.isdigit():
+        return int(phone) % n_shards
+    return zlib.crc32(phone.encode("utf-8")) % n_shards
+
+
+def record_name(phone):
+    return f"{quote(str(phone), safe='')}.json"
+
+
+def write_json(path, data):
+    filestore.write_json(path, data, indent=4)
+
+
+class _ShardRecords:
+    """트랜잭션 안에서 변경 함수에 넘겨주는 매핑. 요청한 고객 파일만 읽어 옵니다."""
+
+    def __init__(self, shard):
+        self._shard = shard
+        self.loaded = {}
+
+    def get(self, phone, default=None):
+        if phone not in self.loaded:
+            self.loaded[phone] = self._shard.read_record(phone)
+        user = self.loaded[phone]
+        return default if user is None else user
+
+    def __contains__(self, phone):
+        return self.get(phone) is not None
+
+    def __getitem__(self, phone):
+        user = self.get(phone)
+        if user is None:
+            raise KeyError(phone)
+        return user
+
+    def __setitem__(self, phone, user):
+        self.loaded[phone] = user
+
+
+class RecordShard:
+    def __init__(self, directory, lock_path, log_path, normalize=None):
+        self.directory = directory
+        self.lock_path = lock_path
+        self.log_path = log_path
+        self._normalize = normalize
+        self._mutex = threading.Lock()
+        self._needs_replay = False
+        os.makedirs(directory, exist_ok=True)
+
+    def record_path(self, phone):
+        return os.path.join(self.directory, record_name(phone))
+
+    def read_record(self, phone):
+        """커밋된 고객 레코드 (없으면 None). 매번 새 객체를 돌려줍니다."""
+        try:
+            with open(self.record_path(phone), "r", encoding="utf-8") as f:
+                user = json.load(f)
+        except FileNotFoundError:
+            return None
+        return self._normalize({phone: user})[phone] if self._normalize else user
+
+    def iter_records(self):
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".json"):
+                phone = unquote(name[: -len(".json")])
+                user = self.read_record(phone)
+                if user is not None:
+                    yield phone, user
+
+    def _stage(self, records, sync=False):
+        """레코드를 모두 임시 파일로 써 두고 (임시 파일, 고객 파일) 목록을 반환.
+
+        하나라도 실패하면 만든 임시 파일을 지우고 예외를 올리므로 고객 파일은 그대로입니다.
+        """
+        staged = []
+        try:
+            for phone, user in records.items():
+                path = self.record_path(phone)
+                staged.append((filestore.temp_path(path), path))
+                with open(staged[-1][0], "w", encoding="utf-8") as f:
+                    json.dump(user, f, indent=4, ensure_ascii=False)
+                    if sync:
+                        f.flush()
+                        os.fsync(f.fileno())
+        except BaseException:
+            _discard(staged)
+            raise
+        return staged
+
+    @timed("save_user_data")
+    def _commit(self, records):
+        """배치가 바꾼 레코드를 기록합니다. 커밋 로그 한 줄의 fsync 가 커밋 시점입니다."""
+        staged = self._stage(records)
+        line = json.dumps(records, ensure_ascii=False) + "\n"
+        try:
+            filestore.append_durable(self.log_path, line.encode("utf-8"))
+        except BaseException:
+            _discard(staged)
+            raise
+        # 이미 커밋된 배치이므로 이후 단계가 실패해도 배치를 실패로 알리지 않고,
+        # 다음 트랜잭션이 시작할 때 로그로 고객 파일을 맞춥니다.
+        try:
+            for tmp, path in staged:
+                os.replace(tmp, path)
+            if os.path.getsize(self.log_path) >= LOG_CHECKPOINT_BYTES:
+                self._replay()
+        except OSError:
+            self._needs_replay = True
+
+    def _replay(self):
+        """로그의 배치를 순서대로 고객 파일에 반영(fsync)하고 로그를 비웁니다. 잠금 안에서 호출."""
+        latest = {}
+        try:
+            with open(self.log_path, "rb") as f:
+                for line in f:
+                    try:
+                        batch = json.loads(line)
+                    except ValueError:
+                        continue  # 기록 도중 중단된 줄: 커밋되지 않은 배치
+                    if isinstance(batch, dict):
+                        latest.update(batch)
+        except FileNotFoundError:
+            return
+        if latest:
+            for tmp, path in self._stage(latest, sync=True):
+                os.replace(tmp, path)
+            filestore.fsync_dir(self.directory)
+        os.truncate(self.log_path, 0)
+        self._needs_replay = False
+
+    def recover(self):
+        """로그에 남은 배치가 있으면 고객 파일에 반영합니다 (프로세스 시작 시)."""
+        with self._mutex, file_lock(self.lock_path):
+            if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > 0:
+                self._replay()
+
+    @contextmanager
+    def transaction(self):
+        """잠금을 잡고 고객 레코드 매핑을 넘겨준 뒤, 블록이 정상 종료되면 읽은 레코드를 한 번에 커밋합니다."""
+        with self._mutex, file_lock(self.lock_path):
+            if self._needs_replay:
+                self._replay()
+            records = _ShardRecords(self)
+            yield records
+            changed = {phone: user for phone, user in records.loaded.items() if user is not None}
+            if changed:
+                self._commit(changed)
+
+
+def _discard(staged):
+    for tmp, _ in staged:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+class ShardedUserStore:
+    def __init__(self, directory=DEFAULT_DIR, n_shards=DEFAULT_SHARDS, legacy_file=None,
+                 normalize=None, window=group_commit.COMMIT_WINDOW):
+        self.directory = directory
+        self.n_shards = n_shards
+        self.window = window
+        os.makedirs(directory, exist_ok=True)
+        self.shards = [
+            RecordShard(
+                os.path.join(directory, f"users_{i:02d}"),
+                os.path.join(directory, f"users_{i:02d}.lock"),
+                os.path.join(directory, f"users_{i:02d}.log"),
+                normalize,
+            )
+            for i in range(n_shards)
+        ]
+        self._committers = [None] * n_shards
+        self._lock = threading.Lock()
+        self._init_layout(legacy_file)
+        for shard in self.shards:
+            shard.recover()
+
+    def _init_layout(self, legacy_file):
+        meta_path = os.path.join(self.directory, META_FILE)
+        with file_lock(os.path.join(self.directory, "_layout.lock")):
+            if os.path.exists(meta_path):
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    existing = json.load(f).get("n_shards")
+                if existing != self.n_shards:
+                    raise ValueError(
+                        f"샤드 수가 다릅니다: 저장소 {existing}개, 설정 {self.n_shards}개. "
+                        "모든 프로세스를 멈춘 뒤 샤드를 다시 나눠야 합니다."
+                    )
+                return
+
+            # 최초 실행: 예전 단일 파일을 고객별 파일로 나눠 옮깁니다.
+            if legacy_file and os.path.exists(legacy_file):
+                with open(legacy_file, "r", encoding="utf-8") as f:
+                    try:
+                        users = json.load(f)
+                    except json.JSONDecodeError:
+                        users = {}
+                for phone, user in users.items():
+                    shard = self.shard_for(phone)
+                    with file_lock(shard.lock_path):
+                        write_json(shard.record_path(phone), user)
+            write_json(meta_path, {"n_shards": self.n_shards})
+
+    def shard_for(self, phone):
+        return self.shards[shard_index(phone, self.n_shards)]
+
+    def committer(self, phone):
+        """전화번호가 속한 샤드의 그룹 커밋 처리기 (프로세스 내 샤드당 1개)."""
+        idx = shard_index(phone, self.n_shards)
+        with self._lock:
+            if self._committers[idx] is None:
+                self._committers[idx] = group_commit.GroupCommitter(self.shards[idx].transaction, window=self.window)
+            return self._committers[idx]
+
+    def submit(self, phone, fn, key=None):
+        """fn(고객 레코드 매핑) 을 해당 샤드의 다음 배치로 커밋하고 (결과, 새로 적용 여부) 를 반환."""
+        return self.committer(phone).submit(fn, key=key)
+
+    def get(self, phone):
+        """커밋된 최신 고객 레코드 사본 (없으면 None). 해당 고객 파일 하나만 읽습니다."""
+        return self.shard_for(phone).read_record(phone)
+
+    def iter_users(self):
+        for shard in self.shards:
+            yield from shard.iter_records()
+
+
+class LoginIndex:
+    """전화번호 뒷자리 -> 비밀번호. 프로세스당 한 번 만들고 가입 시 항목을 추가합니다.
+
+    만들 때 고객 파일을 한 번씩 읽지만 비밀번호만 남기고 레코드는 보관하지 않습니다.
+    다른 프로세스에서 가입한 고객은 이 인덱스에 없을 수 있으므로, 없는 번호는 해당
+    고객 파일로 한 번 더 확인합니다.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._passwords = {}
+        for phone, user in store.iter_users():
+            self._passwords[sys.intern(phone)] = (user or {}).get("pass", "")
+
+    def lookup(self, phone):
+        """등록된 비밀번호 (인덱스에 없으면 None)."""
+        return self._passwords.get(phone)
+
+    def add(self, phone, password):
+        with self._lock:
+            self._passwords[sys.intern(phone)] = password
+
+    def verify(self, phone, password):
+        """(등록 여부, 비밀번호 일치 여부). 인덱스에 없으면 커밋된 고객 파일로 한 번 더 확인합니다."""
+        stored = self.lookup(phone)
+        if stored is None:
+            user = self.store.get(phone)
+            if user is None:
+                return False, False
+            stored = user.get("pass", "")
+            self.add(phone, stored)
+        return True, stored == password
+
+
+def iter_records(directory, modified_since=None):
+    """CLI 도구용: 저장소 디렉터리의 (전화번호 뒷자리, 레코드) 를 하나씩 읽습니다.
+
+    modified_since(유닉스 시각)를 주면 그 뒤에 바뀐 고객 파일만 읽습니다.
+    """
+    for shard_dir in sorted(glob.glob(os.path.join(directory, "users_*"))):
+        if not os.path.isdir(shard_dir):
+            continue
+        for entry in sorted(os.scandir(shard_dir), key=lambda e: e.name):
+            if not entry.name.endswith(".json"):
+                continue
+            if modified_since is not None and entry.stat().st_mtime < modified_since:
+                continue
+            with open(entry.path, "r", encoding="utf-8") as f:
+                yield unquote(entry.name[: -len(".json")]), json.load(f)
+
+
+def iter_users(path, modified_since=None):
+    """CLI 도구용: 저장소 디렉터리 또는 예전 단일 JSON 파일의 (전화번호 뒷자리, 레코드).
+
+    디렉터리는 고객 파일을 하나씩 읽으며, 이터레이터를 소비하는 시점에 읽습니다.
+    modified_since 는 디렉터리에만 적용됩니다 (iter_records 참고).
+    """
+    if os.path.isdir(path):
+        yield from iter_records(path, modified_since)
+    elif os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            yield from json.load(f).items()
+
+
+def load_users(path):
+    """CLI 도구용: 저장소 디렉터리 또는 예전 단일 JSON 파일의 전체 고객 레코드."""
+    return dict(iter_users(path))